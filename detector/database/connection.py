@@ -9,6 +9,17 @@ logger = logging.getLogger('detector.database')
 
 _local = threading.local()
 
+# WAL-safe tuning applied to every connection we open
+TUNING_PRAGMAS = '''
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-65536;
+    PRAGMA busy_timeout=5000;
+    PRAGMA wal_autocheckpoint=1000;
+'''
+
 
 class DatabaseConnection:
     def __init__(self, config):
@@ -29,14 +40,18 @@ class DatabaseConnection:
                 str(self.db_path),
                 timeout=10,
                 check_same_thread=False,
+                cached_statements=256,
             )
             _local.conn.row_factory = sqlite3.Row
-            _local.conn.execute('PRAGMA journal_mode=WAL')
-            _local.conn.execute('PRAGMA synchronous=NORMAL')
+            _local.conn.executescript(TUNING_PRAGMAS)
         return _local.conn
 
     def close(self):
         if hasattr(_local, 'conn') and _local.conn:
+            try:
+                _local.conn.execute('PRAGMA optimize')
+            except sqlite3.Error as e:
+                logger.warning(f"PRAGMA optimize failed: {e}")
             _local.conn.close()
             _local.conn = None
 
@@ -54,7 +69,8 @@ def set_db_path(path):
 
 def get_connection():
     if not hasattr(_local, 'conn') or _local.conn is None:
-        _local.conn = sqlite3.connect(str(_db_path), timeout=10, check_same_thread=False)
+        _local.conn = sqlite3.connect(str(_db_path), timeout=10, check_same_thread=False,
+                                      cached_statements=256)
         _local.conn.row_factory = sqlite3.Row
-        _local.conn.execute('PRAGMA journal_mode=WAL')
+        _local.conn.executescript(TUNING_PRAGMAS)
     return _local.conn
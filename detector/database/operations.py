@@ -1,28 +1,96 @@
 """Database operations — CRUD for alerts and events"""
 
+import time
 import sqlite3
 import logging
 import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from database.connection import TUNING_PRAGMAS
+
 logger = logging.getLogger('detector.database')
 
 _DB_PATH = '/opt/privilege-escalation-detector/data/database/detector.db'
 _local   = threading.local()
 
+# SQL text lives at module level so every call hands the driver the same
+# string and its per-connection statement cache never misses
+_SQL_INSERT_ALERT = '''
+    INSERT OR IGNORE INTO alerts
+      (alert_id, rule_id, rule_name, severity, confidence, description,
+       pid, ppid, uid, new_uid, comm, parent_comm, syscall, filename,
+       timestamp, created_at, acknowledged)
+    VALUES
+      (:alert_id, :rule_id, :rule_name, :severity, :confidence, :description,
+       :pid, :ppid, :uid, :new_uid, :comm, :parent_comm, :syscall, :filename,
+       :timestamp, :created_at, 0)
+'''
+
+_SQL_RECENT_BY_SEVERITY = '''
+    SELECT * FROM alerts
+    WHERE created_at >= ? AND severity = ?
+    ORDER BY created_at DESC LIMIT ?
+'''
+
+_SQL_RECENT = '''
+    SELECT * FROM alerts
+    WHERE created_at >= ?
+    ORDER BY created_at DESC LIMIT ?
+'''
+
+_SQL_ALERT_BY_ID = 'SELECT * FROM alerts WHERE alert_id = ?'
+
+_SQL_ACK_ALERT = '''
+    UPDATE alerts SET acknowledged=1, acknowledged_by=?, acknowledged_at=?
+    WHERE alert_id=?
+'''
+
+# One range scan feeds both the per-severity and the top-rule breakdowns
+_SQL_STATS = '''
+    SELECT severity, rule_id, rule_name, COUNT(*) as count
+    FROM alerts WHERE created_at >= ?
+    GROUP BY severity, rule_id
+'''
+
+_SQL_UNFORWARDED = '''
+    SELECT rowid, * FROM alerts
+    WHERE forwarded = 0
+    ORDER BY rowid ASC LIMIT ?
+'''
+
+_SQL_MARK_FORWARDED = 'UPDATE alerts SET forwarded=1 WHERE rowid IN ({})'
+
+# Stay well under SQLITE_MAX_VARIABLE_NUMBER on older builds (999)
+_MAX_PARAMS = 500
+
+_SQL_UPSERT_BASELINE = '''
+    INSERT INTO baselines (uid, syscall, mean, std, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(uid, syscall) DO UPDATE SET
+      mean=excluded.mean, std=excluded.std, updated_at=excluded.updated_at
+'''
+
+_SQL_LOAD_BASELINES = 'SELECT uid, syscall, mean, std FROM baselines'
+
+
 
 def _init(path='data/database/detector.db'):
     global _DB_PATH
     _DB_PATH = '/opt/privilege-escalation-detector/data/database/detector.db'
 
 
+def _chunks(seq, n):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
 def _conn():
     if not hasattr(_local, 'c') or _local.c is None:
-        _local.c = sqlite3.connect(str(_DB_PATH), timeout=10, check_same_thread=False)
+        _local.c = sqlite3.connect(str(_DB_PATH), timeout=10, check_same_thread=False,
+                                   cached_statements=256)
         _local.c.row_factory = sqlite3.Row
-        _local.c.execute('PRAGMA journal_mode=WAL')
-        _local.c.execute('PRAGMA synchronous=NORMAL')
+        _local.c.executescript(TUNING_PRAGMAS)
     return _local.c
 
 
@@ -30,41 +98,44 @@ class DatabaseOperations:
 
     @staticmethod
     def save_alert(alert: dict) -> bool:
+        return DatabaseOperations.save_alerts([alert])
+
+    @staticmethod
+    def save_alerts(alerts: list) -> bool:
+        """Insert a batch of alerts inside a single write transaction"""
         try:
-            c = _conn()
-            c.execute('''
-                INSERT OR IGNORE INTO alerts
-                  (alert_id, rule_id, rule_name, severity, confidence, description,
-                   pid, ppid, uid, new_uid, comm, parent_comm, syscall, filename,
-                   timestamp, created_at, acknowledged)
-                VALUES
-                  (:alert_id, :rule_id, :rule_name, :severity, :confidence, :description,
-                   :pid, :ppid, :uid, :new_uid, :comm, :parent_comm, :syscall, :filename,
-                   :timestamp, :created_at, 0)
-            ''', alert)
-            c.commit()
+            DatabaseOperations.insert_alerts(alerts)
             return True
         except Exception as e:
-            logger.error(f"save_alert error: {e}")
+            logger.error(f"save_alerts error: {e}")
             return False
 
+    @staticmethod
+    def insert_alerts(alerts: list):
+        """save_alerts that raises, so callers can tell a busy database
+        (sqlite3.OperationalError) from rows that can never be written"""
+        if not alerts:
+            return
+        c = None
+        try:
+            c = _conn()
+            c.execute('BEGIN IMMEDIATE')
+            c.executemany(_SQL_INSERT_ALERT, alerts)
+            c.commit()
+        except Exception:
+            if c is not None and c.in_transaction:
+                c.rollback()
+            raise
+
     @staticmethod
     def get_recent_alerts(hours=24, limit=200, severity=None):
         try:
             c    = _conn()
             since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
             if severity:
-                rows = c.execute('''
-                    SELECT * FROM alerts
-                    WHERE created_at >= ? AND severity = ?
-                    ORDER BY created_at DESC LIMIT ?
-                ''', (since, severity, limit)).fetchall()
+                rows = c.execute(_SQL_RECENT_BY_SEVERITY, (since, severity, limit)).fetchall()
             else:
-                rows = c.execute('''
-                    SELECT * FROM alerts
-                    WHERE created_at >= ?
-                    ORDER BY created_at DESC LIMIT ?
-                ''', (since, limit)).fetchall()
+                rows = c.execute(_SQL_RECENT, (since, limit)).fetchall()
             return [dict(r) for r in rows]
         except Exception as e:
             logger.error(f"get_recent_alerts error: {e}")
@@ -74,7 +145,7 @@ class DatabaseOperations:
     def get_alert_by_id(alert_id: str):
         try:
             c = _conn()
-            row = c.execute('SELECT * FROM alerts WHERE alert_id = ?', (alert_id,)).fetchone()
+            row = c.execute(_SQL_ALERT_BY_ID, (alert_id,)).fetchone()
             return dict(row) if row else None
         except Exception as e:
             logger.error(f"get_alert_by_id error: {e}")
@@ -84,12 +155,9 @@ class DatabaseOperations:
     def acknowledge_alert(alert_id: str, user='analyst', notes='') -> bool:
         try:
             c = _conn()
-            c.execute('''
-                UPDATE alerts SET acknowledged=1, acknowledged_by=?, acknowledged_at=?
-                WHERE alert_id=?
-            ''', (user, datetime.utcnow().isoformat(), alert_id))
+            cur = c.execute(_SQL_ACK_ALERT, (user, datetime.utcnow().isoformat(), alert_id))
             c.commit()
-            return c.rowcount > 0
+            return cur.rowcount > 0
         except Exception as e:
             logger.error(f"acknowledge_alert error: {e}")
             return False
@@ -99,22 +167,17 @@ class DatabaseOperations:
         try:
             c     = _conn()
             since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
-            rows  = c.execute('''
-                SELECT severity, COUNT(*) as count
-                FROM alerts WHERE created_at >= ?
-                GROUP BY severity
-            ''', (since,)).fetchall()
-            by_sev = {r['severity']: r['count'] for r in rows}
-
-            top = c.execute('''
-                SELECT rule_id, rule_name, COUNT(*) as count
-                FROM alerts WHERE created_at >= ?
-                GROUP BY rule_id ORDER BY count DESC LIMIT 10
-            ''', (since,)).fetchall()
+            by_sev = {}
+            rules  = {}
+            for sev, rule_id, rule_name, count in c.execute(_SQL_STATS, (since,)):
+                by_sev[sev] = by_sev.get(sev, 0) + count
+                r = rules.setdefault(rule_id, {'rule_id': rule_id, 'rule_name': rule_name, 'count': 0})
+                r['count'] += count
+            top = sorted(rules.values(), key=lambda r: r['count'], reverse=True)[:10]
 
             return {
                 'by_severity': by_sev,
-                'top_rules':   [dict(r) for r in top],
+                'top_rules':   top,
                 'total':       sum(by_sev.values()),
             }
         except Exception as e:
@@ -125,11 +188,7 @@ class DatabaseOperations:
     def get_unforwarded_alerts(limit=50):
         try:
             c = _conn()
-            rows = c.execute('''
-                SELECT rowid, * FROM alerts
-                WHERE forwarded = 0
-                ORDER BY rowid ASC LIMIT ?
-            ''', (limit,)).fetchall()
+            rows = c.execute(_SQL_UNFORWARDED, (limit,)).fetchall()
             return [dict(r) for r in rows]
         except Exception as e:
             logger.error(f"get_unforwarded_alerts error: {e}")
@@ -137,12 +196,72 @@ class DatabaseOperations:
 
     @staticmethod
     def mark_forwarded(rowids: list) -> bool:
+        if not rowids:
+            return True
+        c = None
         try:
             c = _conn()
-            c.executemany('UPDATE alerts SET forwarded=1 WHERE rowid=?',
-                          [(r,) for r in rowids])
+            c.execute('BEGIN IMMEDIATE')
+            for chunk in _chunks(list(rowids), _MAX_PARAMS):
+                c.execute(_SQL_MARK_FORWARDED.format(','.join('?' * len(chunk))), chunk)
             c.commit()
             return True
         except Exception as e:
+            if c is not None and c.in_transaction:
+                c.rollback()
             logger.error(f"mark_forwarded error: {e}")
             return False
+
+    @staticmethod
+    def save_baseline(uid, syscall, mean, std) -> bool:
+        return DatabaseOperations.save_baselines_batch(
+            [(uid, syscall, mean, std, int(time.time()))])
+
+    @staticmethod
+    def save_baselines_batch(rows: list) -> bool:
+        """Upsert (uid, syscall, mean, std, updated_at) rows in one transaction"""
+        if not rows:
+            return True
+        c = None
+        try:
+            c = _conn()
+            c.execute('BEGIN IMMEDIATE')
+            c.executemany(_SQL_UPSERT_BASELINE, rows)
+            c.commit()
+            return True
+        except Exception as e:
+            if c is not None and c.in_transaction:
+                c.rollback()
+            logger.error(f"save_baselines_batch error: {e}")
+            return False
+
+    @staticmethod
+    def load_baselines():
+        """All stored baselines as (uid, syscall, mean, std) tuples"""
+        try:
+            return [tuple(r) for r in _conn().execute(_SQL_LOAD_BASELINES)]
+        except Exception as e:
+            logger.error(f"load_baselines error: {e}")
+            return []
+
+    @staticmethod
+    def checkpoint() -> bool:
+        """Fold the WAL back into the database and truncate it to zero bytes"""
+        try:
+            busy, _, _ = _conn().execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+            if busy:
+                logger.debug("WAL checkpoint blocked by an active reader/writer")
+            return not busy
+        except Exception as e:
+            logger.error(f"checkpoint error: {e}")
+            return False
+
+    @staticmethod
+    def optimize() -> bool:
+        """Refresh planner statistics on tables that need it"""
+        try:
+            _conn().execute('PRAGMA optimize=0x10002')
+            return True
+        except Exception as e:
+            logger.error(f"optimize error: {e}")
+            return False
@@ -24,10 +24,15 @@ CREATE TABLE IF NOT EXISTS alerts (
     forwarded       INTEGER DEFAULT 0
 );
 
-CREATE INDEX IF NOT EXISTS idx_alerts_severity   ON alerts(severity);
-CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts(created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_alerts_rule_id    ON alerts(rule_id);
-CREATE INDEX IF NOT EXISTS idx_alerts_forwarded  ON alerts(forwarded);
+CREATE INDEX IF NOT EXISTS idx_alerts_created_at  ON alerts(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_sev_created ON alerts(severity, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_rule_id     ON alerts(rule_id);
+-- Partial index: only rows still waiting for the forwarder (id is the rowid alias)
+CREATE INDEX IF NOT EXISTS idx_alerts_unforwarded ON alerts(forwarded, id) WHERE forwarded = 0;
+
+-- Superseded by the composite / partial indexes above
+DROP INDEX IF EXISTS idx_alerts_severity;
+DROP INDEX IF EXISTS idx_alerts_forwarded;
 
 CREATE TABLE IF NOT EXISTS events (
     id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -41,6 +46,15 @@ CREATE TABLE IF NOT EXISTS events (
     created_at  TEXT
 );
 
+CREATE TABLE IF NOT EXISTS baselines (
+    uid         INTEGER NOT NULL,
+    syscall     TEXT    NOT NULL,
+    mean        REAL    NOT NULL,
+    std         REAL    NOT NULL,
+    updated_at  INTEGER NOT NULL,
+    PRIMARY KEY (uid, syscall)
+) WITHOUT ROWID;
+
 CREATE TABLE IF NOT EXISTS statistics (
     id                  INTEGER PRIMARY KEY AUTOINCREMENT,
     events_processed    INTEGER DEFAULT 0,
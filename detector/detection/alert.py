@@ -4,70 +4,186 @@ Alert manager — deduplication, rate limiting, persistence
 
 import uuid
 import time
+import socket
+import sqlite3
 import hashlib
 import logging
-from collections import deque
+import threading
+from operator import attrgetter
+from collections import OrderedDict, namedtuple
 from datetime import datetime, timezone
 
 from database.operations import DatabaseOperations
 
 logger = logging.getLogger('detector.alert')
 
+Alert = namedtuple('Alert', 'rule_id rule_name severity confidence description pid ppid '
+                            'uid new_uid comm parent_comm syscall filename timestamp')
+
+# (rule dict key, default) for each Alert field, in field order
+_DEFAULTS = (
+    ('rule_id',      ''),
+    ('rule_name',    ''),
+    ('severity',     'CRITICAL'),
+    ('confidence',   0.99),
+    ('description',  ''),
+    ('pid',          0),
+    ('ppid',         0),
+    ('uid',          0),
+    ('new_uid',      0),
+    ('comm',         ''),
+    ('parent_comm',  ''),
+    ('syscall_name', ''),
+    ('filename',     ''),
+    ('timestamp',    0),
+)
+
+# Dedup key per rule — attrgetter builds the tuple in C
+_KEY_FNS = {
+    'RULE-01': attrgetter('rule_id', 'uid'),
+    'RULE-05': attrgetter('rule_id', 'uid', 'comm'),
+    'RULE-07': attrgetter('rule_id', 'uid', 'filename'),
+    'RULE-08': attrgetter('rule_id', 'uid'),
+}
+_DEFAULT_KEY_FN = attrgetter('rule_id', 'uid', 'filename')
+
 
 class AlertManager:
     def __init__(self, config):
         self.config        = config
         self.max_per_min   = config.get('alerts.rate_limit.max_alerts_per_minute', 30)
-        self._timestamps   = deque()
+        # Token bucket: refills max_per_min tokens per minute, one per alert
+        self._tokens       = float(self.max_per_min)
+        self._rate         = self.max_per_min / 60.0
+        self._last         = time.time()
+        self._rate_lock    = threading.Lock()
         self._callbacks    = []
         self.generated     = 0
         self.dropped       = 0
-        self._dedup_cache  = {}
+        self._dedup_cache  = OrderedDict()  # key -> last seen, oldest first
+        self._dedup_lock   = threading.Lock()
         self._dedup_window = 600  # 10 minutes
+        self._dedup_max    = 2000
+
+        # Pending writes — drained in one transaction by the flusher thread
+        self.flush_interval = config.get('alerts.batch.flush_interval', 0.1)
+        self.flush_size     = config.get('alerts.batch.max_size', 100)
+        self._pending       = []
+        self._pending_lock  = threading.Lock()
+        self._flush_event   = threading.Event()
+        self._running       = False
+        self._flusher       = None
+
+        # Wakes the forwarder as soon as new alerts are committed; an explicit
+        # null disables it (the forwarder then watches data_version), so read
+        # the raw key rather than Config.get, which maps null to the default
+        alerts_cfg          = config.get_section('alerts') or {}
+        self._notify_path   = alerts_cfg.get('notify_socket', '/run/privesc/alerts.sock')
+        self._notify_sock   = None
+
+    def start(self):
+        if self._notify_path:
+            self._notify_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._notify_sock.setblocking(False)
+        self._running = True
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name='alert-flusher')
+        self._flusher.start()
+
+    def stop(self):
+        self._running = False
+        self._flush_event.set()
+        if self._flusher:
+            self._flusher.join(timeout=3)
+        self.flush()
+        if self._pending:
+            logger.error(f"{len(self._pending)} alerts could not be saved before shutdown")
+        if self._notify_sock:
+            self._notify_sock.close()
+            self._notify_sock = None
+
+    def flush(self):
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            DatabaseOperations.insert_alerts(batch)
+            saved = len(batch)
+        except sqlite3.OperationalError as e:
+            # Busy or unavailable database: keep the batch for the next flush
+            logger.warning(f"Alert batch not saved ({e}) — retrying on next flush")
+            self._requeue(batch)
+            return
+        except Exception as e:
+            # Some row cannot be written; save the rest one by one
+            logger.error(f"Alert batch rejected ({e}) — saving rows individually")
+            saved = self._save_rows(batch)
+        if saved and self._notify_sock:
+            try:
+                self._notify_sock.sendto(b'\x01', self._notify_path)
+            except OSError:
+                pass  # forwarder not running, or it already has a wakeup queued
+
+    def _save_rows(self, batch):
+        saved, retry = 0, []
+        for record in batch:
+            try:
+                DatabaseOperations.insert_alerts([record])
+                saved += 1
+            except sqlite3.OperationalError:
+                retry.append(record)
+            except Exception as e:
+                logger.error(f"Dropping unwritable alert {record.get('alert_id')}: {e}")
+        if retry:
+            self._requeue(retry)
+        return saved
+
+    def _requeue(self, records):
+        # Oldest first at the head; at most flush_size wait for a retry
+        keep = records[:self.flush_size]
+        if len(records) > len(keep):
+            logger.error(f"Dropping {len(records) - len(keep)} unsaved alerts — retry queue full")
+        with self._pending_lock:
+            self._pending[:0] = keep
+
+    def _flush_loop(self):
+        while self._running:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Alert flush error: {e}")
 
     def add_callback(self, fn):
         self._callbacks.append(fn)
 
     def process(self, alert_obj):
         if isinstance(alert_obj, dict):
-            class _A: pass
-            a = _A()
-            a.rule_id     = alert_obj.get('rule_id', '')
-            a.rule_name   = alert_obj.get('rule_name', '')
-            a.severity    = alert_obj.get('severity', 'CRITICAL')
-            a.confidence  = alert_obj.get('confidence', 0.99)
-            a.description = alert_obj.get('description', '')
-            a.pid         = alert_obj.get('pid', 0)
-            a.ppid        = alert_obj.get('ppid', 0)
-            a.uid         = alert_obj.get('uid', 0)
-            a.new_uid     = alert_obj.get('new_uid', 0)
-            a.comm        = alert_obj.get('comm', '')
-            a.parent_comm = alert_obj.get('parent_comm', '')
-            a.syscall     = alert_obj.get('syscall_name', '')
-            a.filename    = alert_obj.get('filename', '')
-            a.timestamp   = alert_obj.get('timestamp', 0)
-            alert_obj = a
+            get = alert_obj.get
+            alert_obj = Alert._make([get(k, d) for k, d in _DEFAULTS])
 
         now = time.time()
 
         # Smart dedup key
-        if alert_obj.rule_id in ('RULE-01', 'RULE-08'):
-            dedup_key = (alert_obj.rule_id, alert_obj.uid)
-        elif alert_obj.rule_id == 'RULE-05':
-            dedup_key = (alert_obj.rule_id, alert_obj.uid, alert_obj.comm)
-        else:
-            dedup_key = (alert_obj.rule_id, alert_obj.uid, alert_obj.filename)
-
-        if dedup_key in self._dedup_cache:
-            if now - self._dedup_cache[dedup_key] < self._dedup_window:
+        dedup_key = _KEY_FNS.get(alert_obj.rule_id, _DEFAULT_KEY_FN)(alert_obj)
+
+        with self._dedup_lock:
+            cache = self._dedup_cache
+            last  = cache.get(dedup_key)
+            if last is not None and now - last < self._dedup_window:
                 self.dropped += 1
                 return False
 
-        self._dedup_cache[dedup_key] = now
+            cache[dedup_key] = now
+            cache.move_to_end(dedup_key)
 
-        if len(self._dedup_cache) > 500:
+            # Oldest entries sit at the front — evict until the head is fresh
             cutoff = now - self._dedup_window
-            self._dedup_cache = {k: v for k, v in self._dedup_cache.items() if v > cutoff}
+            while cache and next(iter(cache.values())) <= cutoff:
+                cache.popitem(last=False)
+            while len(cache) > self._dedup_max:
+                cache.popitem(last=False)
 
         if not self._rate_ok():
             self.dropped += 1
@@ -78,30 +194,19 @@ class AlertManager:
         alert_id  = hashlib.md5(dedup_str.encode()).hexdigest()
         now_str = datetime.now().isoformat()
 
-        record = {
-            'alert_id':     alert_id,
-            'rule_id':      alert_obj.rule_id,
-            'rule_name':    alert_obj.rule_name,
-            'severity':     alert_obj.severity,
-            'confidence':   round(alert_obj.confidence, 3),
-            'description':  alert_obj.description,
-            'pid':          alert_obj.pid,
-            'ppid':         alert_obj.ppid,
-            'uid':          alert_obj.uid,
-            'new_uid':      alert_obj.new_uid,
-            'comm':         alert_obj.comm,
-            'parent_comm':  alert_obj.parent_comm,
-            'syscall':      alert_obj.syscall,
-            'filename':     alert_obj.filename,
-            'timestamp':    alert_obj.timestamp,
-            'created_at':   now_str,
-            'acknowledged': False,
-        }
+        record = alert_obj._asdict()
+        record.update(
+            alert_id=alert_id,
+            confidence=round(alert_obj.confidence, 3),
+            created_at=now_str,
+            acknowledged=False,
+        )
 
-        try:
-            DatabaseOperations.save_alert(record)
-        except Exception as e:
-            logger.error(f"Failed to save alert: {e}")
+        with self._pending_lock:
+            self._pending.append(record)
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._flush_event.set()
 
         self.generated += 1
         logger.warning(f"[{alert_obj.severity}] {alert_obj.rule_id}: {alert_obj.description}")
@@ -115,10 +220,11 @@ class AlertManager:
         return True
 
     def _rate_ok(self):
-        now = time.time()
-        while self._timestamps and now - self._timestamps[0] > 60:
-            self._timestamps.popleft()
-        if len(self._timestamps) >= self.max_per_min:
-            return False
-        self._timestamps.append(now)
-        return True
+        with self._rate_lock:
+            now = time.time()
+            self._tokens = min(self.max_per_min, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
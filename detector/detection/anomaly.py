@@ -3,18 +3,48 @@
 import time
 import logging
 import threading
-from collections import defaultdict
+
+import numpy as np
+
+from ebpf.loader import UID, SYSCALL_NAME, as_event
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 logger = logging.getLogger('detector.anomaly')
 
+# Per-UID counters are split across shards so workers handling different
+# UIDs never contend on the same lock. Must be a power of two.
+_SHARDS = 16
+
+# Initial width of a per-UID counter array (one slot per syscall id)
+_SYSCALL_SLOTS = 16
+
+# Counters cover one wall-clock minute, the same unit as the baselines
+_WINDOW_SECONDS = 60
+
+
+def _score(counts, means, stds, thr):
+    """Mask of events whose running count exceeds mean + thr * std"""
+    return (means > 0) & (counts > means + thr * stds)
+
+
+if NUMBA_AVAILABLE:
+    _score = njit(cache=True)(_score)
+
 
 class AnomalyDetector:
     def __init__(self, config):
         self.config              = config
         self.anomalies_detected  = 0
         self._lock               = threading.Lock()
-        self._syscall_counts     = defaultdict(lambda: defaultdict(int))
-        self._baselines          = {}
+        # Each shard: (lock, {uid: (window, int32 counts indexed by syscall id)})
+        self._shards             = [(threading.Lock(), {}) for _ in range(_SHARDS)]
+        self._syscall_ids        = {}   # syscall name -> counter slot
+        self._baselines          = {}   # (uid, syscall) -> (mean, std)
         self._callbacks          = []
 
         self.deviation_threshold = config.get(
@@ -23,33 +53,79 @@ class AnomalyDetector:
     def add_callback(self, fn):
         self._callbacks.append(fn)
 
+    def _syscall_id(self, syscall):
+        sid = self._syscall_ids.get(syscall)
+        if sid is None:
+            with self._lock:
+                sid = self._syscall_ids.setdefault(syscall, len(self._syscall_ids))
+        return sid
+
+    def _increment(self, uid, syscall, window):
+        sid = self._syscall_id(syscall)
+        lock, counts = self._shards[uid & (_SHARDS - 1)]
+        with lock:
+            last, arr = counts.get(uid, (None, None))
+            if last != window:
+                arr = None   # new minute: counts restart from zero
+            if arr is None or sid >= arr.size:
+                grown = np.zeros(max(_SYSCALL_SLOTS, 2 * (sid + 1)), dtype=np.int32)
+                if arr is not None:
+                    grown[:arr.size] = arr
+                arr = grown
+                counts[uid] = (window, arr)
+            arr[sid] += 1
+            return int(arr[sid])
+
     def process(self, event):
         uid     = event.get('uid', 0)
         syscall = event.get('syscall_name', 'unknown')
+        count   = self._increment(uid, syscall, int(time.time() // _WINDOW_SECONDS))
+
+        baseline = self._baselines.get((uid, syscall))
+        if baseline is None:
+            return
+        mean, std = baseline
+        if mean > 0 and count > mean + self.deviation_threshold * std:
+            self._report(uid, syscall, count, mean, event)
+
+    def process_batch(self, batch):
+        """Count a batch of loader event tuples and score it in one pass"""
+        keys   = [(ev[UID], ev[SYSCALL_NAME] or 'unknown') for ev in batch]
+        window = int(time.time() // _WINDOW_SECONDS)
+        counts = [self._increment(uid, syscall, window) for uid, syscall in keys]
+        get    = self._baselines.get
+        base   = [get(k, (0.0, 0.0)) for k in keys]
 
+        mask = _score(np.array(counts, dtype=np.int64),
+                      np.array([b[0] for b in base], dtype=np.float64),
+                      np.array([b[1] for b in base], dtype=np.float64),
+                      float(self.deviation_threshold))
+        for i in np.flatnonzero(mask):
+            uid, syscall = keys[i]
+            self._report(uid, syscall, counts[i], base[i][0], batch[i])
+
+    def _report(self, uid, syscall, count, mean, event):
         with self._lock:
-            self._syscall_counts[uid][syscall] += 1
-            count    = self._syscall_counts[uid][syscall]
-            baseline = self._baselines.get((uid, syscall))
-
-            if baseline and baseline.get('mean', 0) > 0:
-                mean = baseline['mean']
-                std  = baseline.get('std', mean * 0.5) or mean * 0.5
-                if count > mean + self.deviation_threshold * std:
-                    self.anomalies_detected += 1
-                    for cb in self._callbacks:
-                        try:
-                            cb({
-                                'type':    'anomaly',
-                                'uid':     uid,
-                                'syscall': syscall,
-                                'count':   count,
-                                'mean':    mean,
-                                'event':   event,
-                            })
-                        except Exception as e:
-                            logger.error(f"Anomaly callback error: {e}")
+            self.anomalies_detected += 1
+
+        if type(event) is tuple:
+            event = as_event(event)
+
+        # Dispatch outside any lock so slow callbacks never block workers
+        anomaly = {
+            'type':    'anomaly',
+            'uid':     uid,
+            'syscall': syscall,
+            'count':   count,
+            'mean':    mean,
+            'event':   event,
+        }
+        for cb in self._callbacks:
+            try:
+                cb(anomaly)
+            except Exception as e:
+                logger.error(f"Anomaly callback error: {e}")
 
     def update_baseline(self, uid, syscall, mean, std=None):
-        with self._lock:
-            self._baselines[(uid, syscall)] = {'mean': mean, 'std': std or mean * 0.5}
+        # Replace, never mutate, so readers can look baselines up lock-free
+        self._baselines[(uid, syscall)] = (mean, std or mean * 0.5)
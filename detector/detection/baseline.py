@@ -5,42 +5,113 @@ import time
 import logging
 import threading
 from pathlib import Path
-from collections import defaultdict
+
+import numpy as np
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+from database.operations import DatabaseOperations
 
 logger = logging.getLogger('detector.baseline')
 
+# Events kept per (uid, syscall); older timestamps are overwritten in place
+_BUF_LEN = 4096
+
+
+def _per_minute_stats(timestamps):
+    """(mean, std) of event counts per minute across the given timestamps"""
+    minutes = (timestamps // 60).astype(np.int64)
+    per_min = np.bincount(minutes - minutes.min())
+    return float(per_min.mean()), float(per_min.std())
+
 
 class BaselineManager:
     def __init__(self, config):
         self.config    = config
-        self._data     = defaultdict(lambda: defaultdict(list))
+        self._buf      = {}   # (uid, syscall) -> ring buffer of event timestamps
+        self._idx      = {}   # (uid, syscall) -> events recorded so far
+        self._saved    = {}   # (uid, syscall) -> (mean, std) last persisted
         self._lock     = threading.Lock()
-        self._path     = Path(config.get('database.path', 'data/database/detector.db')).parent.parent / 'baselines'
-        self._path.mkdir(parents=True, exist_ok=True)
         self._load()
 
     def _load(self):
-        for f in self._path.glob('baseline_*.json'):
+        self._import_legacy()
+        self._saved = {(uid, syscall): (mean, std)
+                       for uid, syscall, mean, std in DatabaseOperations.load_baselines()}
+
+    def _import_legacy(self):
+        """One-time import of baseline_<uid>.json files from older releases"""
+        legacy = Path(self.config.get('database.path', 'data/database/detector.db')).parent.parent / 'baselines'
+        files  = sorted(legacy.glob('baseline_*.json')) if legacy.is_dir() else []
+        if not files:
+            return
+
+        now  = int(time.time())
+        rows = []
+        done = []
+        for f in files:
             try:
-                with open(f) as fp:
-                    uid  = int(f.stem.split('_')[1])
-                    data = json.load(fp)
-                    self._data[uid] = defaultdict(list, data)
+                uid  = int(f.stem.split('_')[1])
+                data = _loads(f.read_bytes())
+                for syscall, ts in data.items():
+                    if ts:
+                        mean, std = _per_minute_stats(np.asarray(ts, dtype=np.float64))
+                        rows.append((uid, syscall, mean, std, now))
+                done.append(f)
             except Exception as e:
-                logger.warning(f"Could not load baseline {f}: {e}")
+                logger.warning(f"Could not import baseline {f}: {e}")
+
+        if DatabaseOperations.save_baselines_batch(rows):
+            for f in done:
+                f.rename(f.with_name(f.name + '.imported'))
+            logger.info(f"Imported {len(rows)} legacy baselines from {len(done)} files")
 
     def record(self, uid, syscall):
+        key = (uid, syscall)
+        with self._lock:
+            buf = self._buf.get(key)
+            if buf is None:
+                # float64: float32 cannot resolve epoch seconds (~2 min steps)
+                buf = self._buf[key] = np.zeros(_BUF_LEN, dtype=np.float64)
+            i = self._idx.get(key, 0)
+            buf[i % _BUF_LEN] = time.time()
+            self._idx[key] = i + 1
+
+    def _window(self, key):
+        """Copy of the valid part of a ring buffer (caller holds the lock)"""
+        return self._buf[key][:min(self._idx[key], _BUF_LEN)].copy()
+
+    def stats(self, uid, syscall):
+        """(mean, std) of events per minute, falling back to the stored baseline"""
+        key = (uid, syscall)
+        with self._lock:
+            if key not in self._buf:
+                return self._saved.get(key)
+            ts = self._window(key)
+        return _per_minute_stats(ts)
+
+    def all_stats(self):
         with self._lock:
-            self._data[uid][syscall].append(time.time())
+            keys = set(self._buf) | set(self._saved)
+        return {(uid, syscall): self.stats(uid, syscall) for uid, syscall in keys}
 
     def get_baseline(self, uid):
         with self._lock:
-            d = self._data.get(uid, {})
-            return {sc: len(ts) for sc, ts in d.items()} if d else None
+            d = {sc: n for (u, sc), n in self._idx.items() if u == uid}
+        return d or None
 
     def force_update(self, uid):
-        path = self._path / f'baseline_{uid}.json'
         with self._lock:
-            with open(path, 'w') as f:
-                json.dump(dict(self._data[uid]), f)
-        logger.info(f"Baseline saved for uid {uid}")
+            syscalls = [sc for (u, sc) in self._buf if u == uid]
+        now  = int(time.time())
+        rows = []
+        for syscall in syscalls:
+            mean, std = self.stats(uid, syscall)
+            rows.append((uid, syscall, mean, std, now))
+            self._saved[(uid, syscall)] = (mean, std)
+        if DatabaseOperations.save_baselines_batch(rows):
+            logger.info(f"Baseline saved for uid {uid}")
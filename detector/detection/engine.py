@@ -3,12 +3,13 @@ Detection Engine — orchestrates eBPF loader, rules, anomaly, alerts
 """
 
 import time
-import queue
 import logging
 import threading
+from collections import deque
 from datetime import datetime
 
-from ebpf.loader import EBPFLoader
+from ebpf.loader import EBPFLoader, COMM
+from database.operations import DatabaseOperations
 from detection import rules as rule_engine
 from detection.alert import AlertManager
 from detection.anomaly import AnomalyDetector
@@ -21,7 +22,10 @@ class DetectionEngine:
     def __init__(self, config):
         self.config   = config
         self._running = False
-        self._queue   = queue.Queue(maxsize=config.get('performance.queue_size', 1000))
+        self._queue   = deque()           # batches of loader event tuples
+        self._queued  = 0                 # events across all queued batches
+        self._cv      = threading.Condition()
+        self._queue_cap = config.get('performance.queue_size', 1000)
         self._start_time = None
 
         # Stats
@@ -34,18 +38,28 @@ class DetectionEngine:
         self.alert_manager    = AlertManager(config)
         self.anomaly_detector = AnomalyDetector(config)
         self.baseline_manager = BaselineManager(config)
+        for (uid, syscall), (mean, std) in self.baseline_manager.all_stats().items():
+            self.anomaly_detector.update_baseline(uid, syscall, mean, std)
 
         # Whitelist
         wl = config.get_section('whitelist') or {}
-        self._wl_procs = set(wl.get('processes', []))
-        self._wl_users = set(wl.get('users', []))
+        self._wl_procs = frozenset(wl.get('processes', []))
+        self._wl_users = frozenset(wl.get('users', []))
 
         self._threads = []
+        self._maint_stop        = threading.Event()
+        self._optimize_interval   = config.get('database.optimize_interval', 900)
+        self._checkpoint_interval = config.get('database.checkpoint_interval', 300)
 
     def start(self):
         self._running    = True
         self._start_time = time.time()
 
+        self.alert_manager.start()
+
+        self._maint_stop.clear()
+        threading.Thread(target=self._maintenance, daemon=True, name='db-maintenance').start()
+
         # Start worker threads
         for i in range(self.config.get('performance.worker_threads', 2)):
             t = threading.Thread(target=self._worker, daemon=True, name=f'worker-{i}')
@@ -54,6 +68,7 @@ class DetectionEngine:
 
         # Register eBPF callback
         self.ebpf_loader.add_callback(self._enqueue)
+        self.ebpf_loader.set_whitelist(self._wl_procs)
         ok = self.ebpf_loader.start()
         if not ok:
             logger.warning("eBPF unavailable — detector running in limited mode")
@@ -62,44 +77,64 @@ class DetectionEngine:
 
     def stop(self):
         self._running = False
+        self._maint_stop.set()
         self.ebpf_loader.stop()
-        for _ in self._threads:
-            self._queue.put(None)
+        with self._cv:
+            self._cv.notify_all()
         for t in self._threads:
             t.join(timeout=3)
+        self.alert_manager.stop()
         logger.info("Detection engine stopped")
 
-    def _enqueue(self, event):
-        try:
-            self._queue.put_nowait(event)
-        except queue.Full:
-            self.events_dropped += 1
+    def _enqueue(self, batch):
+        with self._cv:
+            if self._queued + len(batch) > self._queue_cap:
+                self.events_dropped += len(batch)
+                return
+            self._queue.append(batch)
+            self._queued += len(batch)
+            self._cv.notify()
 
     def _worker(self):
-        while self._running:
+        while True:
+            with self._cv:
+                while not self._queue and self._running:
+                    self._cv.wait(timeout=1)
+                if not self._queue:
+                    break  # stopped and drained
+                batch = self._queue.popleft()
+                self._queued -= len(batch)
             try:
-                event = self._queue.get(timeout=1)
-                if event is None:
-                    break
-                self._process(event)
-            except queue.Empty:
-                continue
+                self._process(batch)
             except Exception as e:
                 logger.error(f"Worker error: {e}", exc_info=True)
 
-    def _process(self, event):
-        self.events_processed += 1
-
-        # Whitelist check
-        comm = event.get('comm', '')
-        uid  = event.get('uid', 0)
-        if comm in self._wl_procs:
-            return
+    def _maintenance(self):
+        # Both calls swallow their own errors — a busy database only
+        # postpones the work to the next tick
+        last_optimize = time.time()
+        while not self._maint_stop.wait(self._checkpoint_interval):
+            rule_engine.sweep_state()
+            DatabaseOperations.checkpoint()
+            if time.time() - last_optimize >= self._optimize_interval:
+                DatabaseOperations.optimize()
+                last_optimize = time.time()
+
+    def _process(self, batch):
+        self.events_processed += len(batch)
+
+        # Whitelisted processes are normally dropped in-kernel; filter here
+        # only if the eBPF map could not be populated
+        if not self.ebpf_loader.whitelist_in_kernel:
+            wl = self._wl_procs
+            batch = [ev for ev in batch if ev[COMM] not in wl]
+            if not batch:
+                return
         # Allow root uid (0) through — rules decide what to do with it
 
         # Run rules
         try:
-            alerts = rule_engine.check_event(event)
+            alerts = rule_engine.check_batch(batch)
             for a in alerts:
                 self.rules_triggered += 1
                 self.alert_manager.process(a)
@@ -109,7 +144,7 @@ class DetectionEngine:
         # Anomaly detection
         if self.config.get('detection.anomaly_enabled', True):
             try:
-                self.anomaly_detector.process(event)
+                self.anomaly_detector.process_batch(batch)
             except Exception as e:
                 logger.error(f"Anomaly error: {e}")
 
@@ -124,5 +159,5 @@ class DetectionEngine:
             'anomalies_detected': self.anomaly_detector.anomalies_detected,
             'runtime_seconds':   int(runtime),
             'events_per_second': round(self.events_processed / max(runtime, 1), 2),
-            'queue_size':        self._queue.qsize(),
+            'queue_size':        self._queued,
         }
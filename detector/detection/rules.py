@@ -3,190 +3,340 @@ Privilege Escalation Detection Rules
 TRUE-POSITIVE ONLY — EDR Grade
 """
 
+import re
 import time
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+from ebpf.loader import (
+    PID, UID, EUID, NEW_UID, OPEN_FLAGS, COMM, FILENAME, SYSCALL_NAME, as_event,
+)
+
+
+class TTLCache:
+    """Per-PID state bounded by entry count and age.
+
+    Entries are kept in insertion order, so the oldest ones sit at the
+    front and are evicted there on every write.
+    """
+
+    def __init__(self, maxlen, ttl):
+        self.maxlen = maxlen
+        self.ttl    = ttl
+        self._data  = OrderedDict()   # key -> (inserted_at, value)
+        self._lock  = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if time.time() - item[0] > self.ttl:
+                del self._data[key]
+                return default
+            return item[1]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now, value)
+            self._data.move_to_end(key)
+            self._evict(now)
+
+    def setdefault(self, key, value):
+        """Return the live value for key, storing value if there is none"""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and now - item[0] <= self.ttl:
+                return item[1]
+            self._data[key] = (now, value)
+            self._data.move_to_end(key)
+            self._evict(now)
+            return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def sweep(self):
+        """Expire aged entries without waiting for the next write"""
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now):
+        data = self._data
+        while len(data) > self.maxlen:
+            data.popitem(last=False)
+        while data and now - next(iter(data.values()))[0] > self.ttl:
+            data.popitem(last=False)
+
 
-SIGNALS = defaultdict(set)
-SIGNAL_TIME = {}
 WINDOW = 15
 
-CAPSET_CACHE = {}
-LD_PRELOAD_CACHE = {}
+# pid -> set of escalation signals seen within WINDOW of the first one
+SIGNALS = TTLCache(4096, WINDOW)
+
+CAPSET_CACHE = TTLCache(4096, 5)
+LD_PRELOAD_CACHE = TTLCache(4096, WINDOW)
 
 WRITABLE_PATHS   = ('/tmp/', '/dev/shm/', '/var/tmp/')
-CREDENTIAL_FILES = {'/etc/shadow', '/etc/gshadow'}
+CREDENTIAL_FILES = frozenset({'/etc/shadow', '/etc/gshadow'})
 SUDOERS_FILE     = '/etc/sudoers'
-DOCKER_SOCKETS   = {'/var/run/docker.sock', '/run/docker.sock'}
-SHELLS           = {'bash', 'sh', 'dash', 'zsh'}
-KERNEL_TOOLS     = {'insmod', 'modprobe', 'rmmod'}
-GTFOBINS         = {
+DOCKER_SOCKETS   = frozenset({'/var/run/docker.sock', '/run/docker.sock'})
+SHELLS           = frozenset({'bash', 'sh', 'dash', 'zsh'})
+KERNEL_TOOLS     = frozenset({'insmod', 'modprobe', 'rmmod'})
+GTFOBINS         = frozenset({
     'vim','vi','less','nano','man','env','find','awk','perl',
     'python','python3','ruby','lua','node','php','gcc','make',
     'nmap','tcpdump','bash','sh','dash','zsh'
-}
+})
 
 # Processes that legitimately touch sensitive files
-SAFE_SHADOW = {'passwd','chpasswd','chage','useradd','usermod','shadow','unix_chkpwd','sudo','su'}
-SAFE_SSH      = {'sshd','ssh-keygen','ssh-keyscan'}
-SAFE_DOCKER   = {'dockerd','containerd','docker','dockerd-current'}
-SAFE_SUDOERS  = {'visudo','dpkg','apt','apt-get','ansible','sudo'}
+SAFE_SHADOW = frozenset({'passwd','chpasswd','chage','useradd','usermod','shadow','unix_chkpwd','sudo','su'})
+SAFE_SSH      = frozenset({'sshd','ssh-keygen','ssh-keyscan'})
+SAFE_DOCKER   = frozenset({'dockerd','containerd','docker','dockerd-current'})
+SAFE_SUDOERS  = frozenset({'visudo','dpkg','apt','apt-get','ansible','sudo'})
+SAFE_SETUID   = frozenset({'sudo','su','pkexec','newgrp','passwd',
+                           'gdbus','vmtoolsd','polkit','dbus-daemon'})
+
+
+# ── Path classification ────────────────────────────────────────
+# Prefix and substring checks shared by several rules are compiled into
+# one automaton, so each path is scanned once and the rules just test
+# tags. Exact-match paths stay as frozenset lookups (a single hash).
+_PREFIX, _ANYWHERE = 0, 1
+_PATH_PATTERNS = [(p, 'writable', _PREFIX) for p in WRITABLE_PATHS] + [
+    ('/root/.ssh/', 'ssh_root', _ANYWHERE),
+]
+_NO_TAGS = frozenset()
+
+if AHOCORASICK_AVAILABLE:
+    _AUTOMATON = ahocorasick.Automaton()
+    for _needle, _tag, _anchor in _PATH_PATTERNS:
+        _AUTOMATON.add_word(_needle, (_tag, _anchor, len(_needle)))
+    _AUTOMATON.make_automaton()
+
+    def path_tags(path):
+        if not path:
+            return _NO_TAGS
+        return {tag for end, (tag, anchor, n) in _AUTOMATON.iter(path)
+                if anchor == _ANYWHERE or end + 1 == n}
+else:
+    def path_tags(path):
+        if not path:
+            return _NO_TAGS
+        return {tag for needle, tag, anchor in _PATH_PATTERNS
+                if (path.startswith(needle) if anchor == _PREFIX else needle in path)}
+
+
+_PROC_MEM = re.compile(r'/*proc/[^/]*/mem/*\Z')
+_proc_mem = _PROC_MEM.match   # raw match for the hot path; truthiness is all it needs
 
 
 def is_proc_mem(path):
-    parts = path.strip('/').split('/')
-    return len(parts) == 3 and parts[0] == 'proc' and parts[2] == 'mem'
+    return _proc_mem(path) is not None
 
 
 def register(pid, sig):
-    if pid not in SIGNAL_TIME:
-        SIGNAL_TIME[pid] = time.time()
-    SIGNALS[pid].add(sig)
+    SIGNALS.setdefault(pid, set()).add(sig)
 
 
 def confirmed_escalation(pid, event):
-    now = time.time()
-    if pid not in SIGNAL_TIME:
-        return None
-    if now - SIGNAL_TIME[pid] > WINDOW:
-        SIGNALS.pop(pid, None)
-        SIGNAL_TIME.pop(pid, None)
-        return None
-    if len(SIGNALS[pid]) >= 2:
+    signals = SIGNALS.get(pid)
+    if signals and len(signals) >= 2:
         return {
             'rule_id':   'RULE-10',
             'rule_name': 'Confirmed Privilege Escalation',
             'severity':  'CRITICAL',
-            'description': f'Multiple escalation signals: {", ".join(SIGNALS[pid])}',
+            'description': f'Multiple escalation signals: {", ".join(signals)}',
             **event
         }
     return None
 
 
-def check_event(event):
-    alerts = []
-    pid     = event.get('pid', 0)
-    uid     = event.get('uid', 9999)
-    euid    = event.get('euid', 9999)
-    new_uid = event.get('new_uid', 9999)
-    comm    = event.get('comm', '').strip()
-    pcomm   = event.get('parent_comm', '').strip()
-    syscall = event.get('syscall_name', '')
-    path    = (event.get('filename') or '').strip()
-    flags   = event.get('open_flags', 0)
-    now     = time.time()
-
-    # ── RULE-01: Direct UID → root (non-root process calling setuid(0))
-    if (syscall in ('setuid', 'setreuid', 'setresuid')
-            and uid >= 1000 and new_uid == 0
-            and comm not in ('sudo','su','pkexec','newgrp','passwd',
-                             'gdbus','vmtoolsd','polkit','dbus-daemon')):
-        alerts.append({
+def sweep_state():
+    """Drop expired per-PID state for processes that have gone quiet"""
+    for cache in (SIGNALS, CAPSET_CACHE, LD_PRELOAD_CACHE):
+        cache.sweep()
+
+
+# ── Rules ──────────────────────────────────────────────────────
+# Each rule takes the pre-extracted event fields plus the path tags and
+# returns the rule-specific part of an alert (or None). check_event merges the
+# event itself into every hit.
+
+def _rule01(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Direct UID → root (non-root process calling setuid(0))
+    if uid >= 1000 and new_uid == 0 and comm not in SAFE_SETUID:
+        register(pid, 'setuid_root')
+        return {
             'rule_id': 'RULE-01', 'rule_name': 'Direct UID to Root',
             'severity': 'CRITICAL',
             'description': f'UID {uid} → root via {syscall} (PID {pid}, {comm})',
-            **event
-        })
-        register(pid, 'setuid_root')
+        }
 
-    # ── RULE-02: Shadow/gshadow file modified by unexpected process
-    if (syscall in ('openat', 'chmod')
-            and path in CREDENTIAL_FILES
+
+def _rule02(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Shadow/gshadow file modified by unexpected process
+    if (path in CREDENTIAL_FILES
             and comm not in SAFE_SHADOW
             and (flags & 3) in (1, 2)):
-        alerts.append({
+        register(pid, 'shadow')
+        return {
             'rule_id': 'RULE-02', 'rule_name': 'Shadow File Tampered',
             'severity': 'CRITICAL',
             'description': f'{path} modified by {comm} (UID {uid}, PID {pid})',
-            **event
-        })
-        register(pid, 'shadow')
+        }
+
 
-    # ── RULE-03: Root SSH key injection
-    if (syscall == 'openat'
-            and '/root/.ssh/' in path
-            and comm not in SAFE_SSH):
-        alerts.append({
+def _rule03(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Root SSH key injection
+    if 'ssh_root' in tags and comm not in SAFE_SSH:
+        register(pid, 'ssh')
+        return {
             'rule_id': 'RULE-03', 'rule_name': 'Root SSH Key Injection',
             'severity': 'CRITICAL',
             'description': f'Root SSH file accessed: {path} by {comm} (UID {uid})',
-            **event
-        })
-        register(pid, 'ssh')
+        }
 
-    # ── RULE-04: Process memory injection (/proc/<pid>/mem write)
-    if (syscall == 'openat'
-            and is_proc_mem(path)
-            and flags & 3):
-        alerts.append({
+
+def _rule04(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Process memory injection (/proc/<pid>/mem write)
+    if flags & 3 and _proc_mem(path):
+        register(pid, 'proc_mem')
+        return {
             'rule_id': 'RULE-04', 'rule_name': 'Process Memory Injection',
             'severity': 'CRITICAL',
             'description': f'Write to {path} by {comm} (UID {uid})',
-            **event
-        })
-        register(pid, 'proc_mem')
+        }
+
 
-    # ── RULE-05: Kernel module abuse by any user
-    if (syscall in ('execve', 'openat')
-            and comm in KERNEL_TOOLS
-            and uid >= 1000):
-        alerts.append({
+def _rule05(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Kernel module abuse by any user
+    if comm in KERNEL_TOOLS and uid >= 1000:
+        register(pid, 'kernel')
+        return {
             'rule_id': 'RULE-05', 'rule_name': 'Kernel Module Abuse',
             'severity': 'CRITICAL',
             'description': f'{comm} executed by UID {uid} (PID {pid})',
-            **event
-        })
-        register(pid, 'kernel')
+        }
 
-    # ── RULE-06: Docker socket abuse by unexpected process
-    if (syscall == 'openat'
-            and path in DOCKER_SOCKETS
-            and comm not in SAFE_DOCKER):
-        alerts.append({
+
+def _rule06(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Docker socket abuse by unexpected process
+    if path in DOCKER_SOCKETS and comm not in SAFE_DOCKER:
+        register(pid, 'docker')
+        return {
             'rule_id': 'RULE-06', 'rule_name': 'Docker Socket Abuse',
             'severity': 'CRITICAL',
             'description': f'Docker socket accessed by {comm} (UID {uid})',
-            **event
-        })
-        register(pid, 'docker')
+        }
+
 
-    # ── RULE-07: SUID binary executed from writable path
-    if (syscall == 'execve'
-            and euid == 0 and uid >= 1000
-            and path.startswith(WRITABLE_PATHS)):
-        alerts.append({
+def _rule07(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # SUID binary executed from writable path
+    if euid == 0 and uid >= 1000 and 'writable' in tags:
+        register(pid, 'suid_tmp')
+        return {
             'rule_id': 'RULE-07', 'rule_name': 'SUID from Writable Path',
             'severity': 'CRITICAL',
             'description': f'Root exec from {path} (UID {uid}, PID {pid})',
-            **event
-        })
-        register(pid, 'suid_tmp')
+        }
+
+
+def _rule08_capset(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Capability abuse, part 1 — remember non-root capset calls
+    if uid >= 1000:
+        CAPSET_CACHE.set(pid, now)
 
-    # ── RULE-08: Capability abuse (capset then root exec within 5s)
-    if syscall == 'capset' and uid >= 1000:
-        CAPSET_CACHE[pid] = now
-    if (syscall == 'execve' and euid == 0
-            and pid in CAPSET_CACHE
-            and now - CAPSET_CACHE[pid] < 5):
-        alerts.append({
+
+def _rule08_exec(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Capability abuse, part 2 — root exec within 5s of capset
+    if euid == 0 and CAPSET_CACHE.get(pid) is not None:
+        register(pid, 'capset')
+        CAPSET_CACHE.pop(pid)
+        return {
             'rule_id': 'RULE-08', 'rule_name': 'Capability Abuse',
             'severity': 'CRITICAL',
             'description': f'capset → root exec: {comm} (PID {pid})',
-            **event
-        })
-        register(pid, 'capset')
-        CAPSET_CACHE.pop(pid, None)
+        }
+
 
-    # ── RULE-09: Sudoers file tampered by unexpected process
-    if (syscall in ('openat', 'chmod')
-            and path == SUDOERS_FILE
-            and comm not in SAFE_SUDOERS):
-        alerts.append({
+def _rule09(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now):
+    # Sudoers file tampered by unexpected process
+    if path == SUDOERS_FILE and comm not in SAFE_SUDOERS:
+        register(pid, 'sudoers')
+        return {
             'rule_id': 'RULE-09', 'rule_name': 'Sudoers Tampering',
             'severity': 'CRITICAL',
             'description': f'/etc/sudoers modified by {comm} (UID {uid}, PID {pid})',
-            **event
-        })
-        register(pid, 'sudoers')
+        }
+
+
+# Only the rules that can fire for a syscall are run for it, in rule order
+RULES_BY_SYSCALL = defaultdict(list)
+for _sc in ('setuid', 'setreuid', 'setresuid'):
+    RULES_BY_SYSCALL[_sc].append(_rule01)
+RULES_BY_SYSCALL['openat'] += [_rule02, _rule03, _rule04, _rule05, _rule06, _rule09]
+RULES_BY_SYSCALL['chmod']  += [_rule02, _rule09]
+RULES_BY_SYSCALL['execve'] += [_rule05, _rule07, _rule08_exec]
+RULES_BY_SYSCALL['capset'] += [_rule08_capset]
+RULES_BY_SYSCALL = dict(RULES_BY_SYSCALL)
+
+
+def check_event(event):
+    syscall = event.get('syscall_name', '')
+    rules   = RULES_BY_SYSCALL.get(syscall)
+    if not rules:
+        return []
+
+    pid     = event.get('pid', 0)
+    uid     = event.get('uid', 9999)
+    euid    = event.get('euid', 9999)
+    new_uid = event.get('new_uid', 9999)
+    comm    = event.get('comm', '').strip()
+    path    = (event.get('filename') or '').strip()
+    flags   = event.get('open_flags', 0)
+
+    return _evaluate(rules, event, pid, uid, euid, new_uid, comm, syscall,
+                     path, flags, time.time())
+
+
+def check_batch(batch):
+    """Run the rules over a batch of loader event tuples"""
+    alerts = []
+    now    = time.time()
+    for ev in batch:
+        syscall = ev[SYSCALL_NAME]
+        rules   = RULES_BY_SYSCALL.get(syscall)
+        if rules:
+            alerts += _evaluate(rules, ev, ev[PID], ev[UID], ev[EUID], ev[NEW_UID],
+                                ev[COMM].strip(), syscall, ev[FILENAME].strip(),
+                                ev[OPEN_FLAGS], now)
+    return alerts
+
+
+def _evaluate(rules, event, pid, uid, euid, new_uid, comm, syscall, path, flags, now):
+    alerts = []
+    tags   = path_tags(path)
+    for fn in rules:
+        hit = fn(pid, uid, euid, new_uid, comm, syscall, path, flags, tags, now)
+        if hit:
+            # Batch tuples only become dicts once something fires
+            if type(event) is tuple:
+                event = as_event(event)
+            alerts.append({**hit, **event})
 
     # ── RULE-10: Confirmed escalation (2+ signals within 15s)
     if alerts:
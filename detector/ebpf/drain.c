@@ -0,0 +1,208 @@
+/*
+ * drain.c
+ * Native ring buffer drain — owns ring_buffer__poll on its own pthread
+ * (outside the GIL) and copies records into a preallocated SPSC queue.
+ * The Python loader sleeps on an eventfd and takes records in batches.
+ * Built into libdrain.so by the Makefile; driven from ebpf/drain.py.
+ */
+
+#define _GNU_SOURCE
+#include <errno.h>
+#include <sched.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <pthread.h>
+#include <sys/eventfd.h>
+#include <bpf/libbpf.h>
+
+#define POLL_MIN_MS 1
+#define POLL_MAX_MS 1000
+
+struct drain {
+    struct ring_buffer *rb;
+    pthread_t           thread;
+    int                 joinable;
+    int                 efd;
+    int                 running;
+    size_t              rec_size;
+    uint64_t            mask;
+    uint64_t            watermark;
+    uint64_t            head;       /* written by the drain thread only */
+    uint64_t            tail;       /* written by the consumer only */
+    uint64_t            signalled;  /* head at the last wakeup (drain thread) */
+    uint64_t            dropped;
+    char               *buf;
+};
+
+/* ── Helper: wake the Python consumer ─────────────────────── */
+static void notify(struct drain *d) {
+    uint64_t one = 1;
+    d->signalled = d->head;
+    (void)!write(d->efd, &one, sizeof(one));
+}
+
+/* ── Ring buffer callback: copy one record into the queue ─── */
+static int on_sample(void *ctx, void *data, size_t size) {
+    struct drain *d = ctx;
+    uint64_t head = d->head;
+    uint64_t tail = __atomic_load_n(&d->tail, __ATOMIC_ACQUIRE);
+
+    if (head - tail > d->mask) {
+        __atomic_add_fetch(&d->dropped, 1, __ATOMIC_RELAXED);
+        return 0;
+    }
+    memcpy(d->buf + (head & d->mask) * d->rec_size, data,
+           size < d->rec_size ? size : d->rec_size);
+    __atomic_store_n(&d->head, head + 1, __ATOMIC_RELEASE);
+
+    if (head + 1 - d->signalled >= d->watermark)
+        notify(d);
+    return 0;
+}
+
+/* ── Drain thread: adaptive poll, wake consumer per drain ── */
+static void *run(void *arg) {
+    struct drain *d = arg;
+    int timeout = 100;
+
+    while (__atomic_load_n(&d->running, __ATOMIC_ACQUIRE)) {
+        int n = ring_buffer__poll(d->rb, timeout);
+        if (n < 0 && n != -EINTR)
+            break;
+        /* poll only reads rings epoll reported; records submitted with
+         * BPF_RB_NO_WAKEUP never are, so collect them explicitly */
+        int c = ring_buffer__consume(d->rb);
+        if (c < 0)
+            break;
+        n = (n > 0 ? n : 0) + c;
+        /* Hand off whatever this poll drained, even below the watermark */
+        if (d->head != d->signalled)
+            notify(d);
+        if (n > 0)
+            timeout = timeout / 2 > POLL_MIN_MS ? timeout / 2 : POLL_MIN_MS;
+        else
+            timeout = timeout * 2 < POLL_MAX_MS ? timeout * 2 : POLL_MAX_MS;
+    }
+    __atomic_store_n(&d->running, 0, __ATOMIC_RELEASE);
+    notify(d);
+    return NULL;
+}
+
+void drain_free(struct drain *d);
+
+/* capacity must be a power of two */
+struct drain *drain_start(int map_fd, size_t rec_size, uint64_t capacity, uint64_t watermark) {
+    struct drain *d;
+    int err;
+
+    if (!capacity || (capacity & (capacity - 1))) {
+        errno = EINVAL;
+        return NULL;
+    }
+    d = calloc(1, sizeof(*d));
+    if (!d)
+        return NULL;
+    d->efd       = -1;
+    d->rec_size  = rec_size;
+    d->mask      = capacity - 1;
+    d->watermark = watermark ? watermark : 1;
+    d->buf       = malloc(capacity * rec_size);
+    if (!d->buf)
+        goto fail;
+
+    d->efd = eventfd(0, EFD_CLOEXEC);
+    if (d->efd < 0)
+        goto fail;
+
+    d->rb = ring_buffer__new(map_fd, on_sample, d, NULL);
+    if (!d->rb)
+        goto fail;
+
+    d->running = 1;
+    err = pthread_create(&d->thread, NULL, run, d);
+    if (err) {
+        d->running = 0;
+        errno = err;
+        goto fail;
+    }
+    d->joinable = 1;
+    return d;
+
+fail:
+    err = errno;
+    drain_free(d);
+    errno = err;
+    return NULL;
+}
+
+int drain_eventfd(struct drain *d) {
+    return d->efd;
+}
+
+int drain_running(struct drain *d) {
+    return __atomic_load_n(&d->running, __ATOMIC_ACQUIRE);
+}
+
+uint64_t drain_dropped(struct drain *d) {
+    return __atomic_load_n(&d->dropped, __ATOMIC_RELAXED);
+}
+
+/* Copy up to max queued records into out; returns the number copied */
+size_t drain_take(struct drain *d, void *out, size_t max) {
+    uint64_t tail = d->tail;
+    uint64_t head = __atomic_load_n(&d->head, __ATOMIC_ACQUIRE);
+    size_t   n    = head - tail < max ? head - tail : max;
+
+    for (size_t i = 0; i < n; i++)
+        memcpy((char *)out + i * d->rec_size,
+               d->buf + ((tail + i) & d->mask) * d->rec_size, d->rec_size);
+    __atomic_store_n(&d->tail, tail + n, __ATOMIC_RELEASE);
+    return n;
+}
+
+/* Pin the drain thread to one CPU and optionally run it SCHED_FIFO
+ * (needs CAP_SYS_NICE); returns 0 or an errno value */
+int drain_pin(struct drain *d, int cpu, int fifo_prio) {
+    int err;
+
+    if (!d->joinable)
+        return ESRCH;
+    if (cpu >= 0) {
+        cpu_set_t set;
+        CPU_ZERO(&set);
+        CPU_SET(cpu, &set);
+        err = pthread_setaffinity_np(d->thread, sizeof(set), &set);
+        if (err)
+            return err;
+    }
+    if (fifo_prio > 0) {
+        struct sched_param sp = { .sched_priority = fifo_prio };
+        err = pthread_setschedparam(d->thread, SCHED_FIFO, &sp);
+        if (err)
+            return err;
+    }
+    return 0;
+}
+
+/* Stop and join the drain thread; queued records stay readable */
+void drain_stop(struct drain *d) {
+    __atomic_store_n(&d->running, 0, __ATOMIC_RELEASE);
+    if (d->joinable) {
+        pthread_join(d->thread, NULL);
+        d->joinable = 0;
+    }
+}
+
+void drain_free(struct drain *d) {
+    if (!d)
+        return;
+    drain_stop(d);
+    if (d->rb)
+        ring_buffer__free(d->rb);
+    if (d->efd >= 0)
+        close(d->efd);
+    free(d->buf);
+    free(d);
+}
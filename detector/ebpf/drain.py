@@ -0,0 +1,84 @@
+"""
+Native ring buffer drain — ctypes front end for libdrain.so (drain.c).
+A C pthread polls the BPF ring buffer without holding the GIL and queues
+raw records; Python wakes on an eventfd and takes them in batches.
+"""
+
+import os
+import ctypes
+import logging
+from pathlib import Path
+
+logger = logging.getLogger('detector.ebpf')
+
+# Built by ebpf/Makefile next to the BPF object
+DRAIN_LIB = Path(__file__).parent / 'libdrain.so'
+
+
+def _load_drain():
+    if not DRAIN_LIB.exists():
+        return None
+    try:
+        lib = ctypes.CDLL(str(DRAIN_LIB), use_errno=True)
+    except OSError as e:
+        logger.warning(f"libdrain.so unusable: {e}")
+        return None
+    _vp = ctypes.c_void_p
+    for name, res, args in (
+        ('drain_start',   _vp,             [ctypes.c_int, ctypes.c_size_t, ctypes.c_uint64, ctypes.c_uint64]),
+        ('drain_eventfd', ctypes.c_int,    [_vp]),
+        ('drain_running', ctypes.c_int,    [_vp]),
+        ('drain_dropped', ctypes.c_uint64, [_vp]),
+        ('drain_take',    ctypes.c_size_t, [_vp, _vp, ctypes.c_size_t]),
+        ('drain_pin',     ctypes.c_int,    [_vp, ctypes.c_int, ctypes.c_int]),
+        ('drain_stop',    None,            [_vp]),
+        ('drain_free',    None,            [_vp]),
+    ):
+        fn = getattr(lib, name)
+        fn.restype, fn.argtypes = res, args
+    return lib
+
+
+_lib = _load_drain()
+DRAIN_AVAILABLE = _lib is not None
+
+
+class RingDrain:
+    """Ring buffer drained by a native thread into a bounded SPSC queue"""
+
+    def __init__(self, map_fd, record_type, capacity=65536, watermark=64):
+        self._d = _lib.drain_start(map_fd, ctypes.sizeof(record_type), capacity, watermark)
+        if not self._d:
+            err = ctypes.get_errno()
+            raise OSError(err, f"drain_start failed: {os.strerror(err)}")
+        self._efd = _lib.drain_eventfd(self._d)
+
+    def wait(self):
+        """Block (GIL released) until the drain thread reports new records"""
+        os.read(self._efd, 8)
+
+    def take(self, out):
+        """Copy queued records into the ctypes array out; returns the count"""
+        return _lib.drain_take(self._d, out, len(out))
+
+    def pin(self, cpu, priority=0):
+        """Bind the native thread to cpu; priority > 0 also sets SCHED_FIFO"""
+        err = _lib.drain_pin(self._d, cpu, priority)
+        if err:
+            raise OSError(err, f"drain_pin failed: {os.strerror(err)}")
+
+    @property
+    def running(self):
+        return bool(_lib.drain_running(self._d))
+
+    @property
+    def dropped(self):
+        return _lib.drain_dropped(self._d)
+
+    def stop(self):
+        _lib.drain_stop(self._d)
+
+    def close(self):
+        if self._d:
+            _lib.drain_free(self._d)
+            self._d = None
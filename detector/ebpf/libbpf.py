@@ -0,0 +1,158 @@
+"""
+Minimal ctypes binding for libbpf — opens, loads and attaches the
+pre-compiled CO-RE object (syscall_monitor.bpf.o) and drains its ring buffer.
+"""
+
+import os
+import errno
+import ctypes
+import ctypes.util
+import logging
+
+logger = logging.getLogger('detector.ebpf')
+
+# int (*ring_buffer_sample_fn)(void *ctx, void *data, size_t size)
+RING_BUFFER_SAMPLE_FN = ctypes.CFUNCTYPE(
+    ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+
+
+def _load_libbpf():
+    for name in (ctypes.util.find_library('bpf'), 'libbpf.so.1', 'libbpf.so.0'):
+        if not name:
+            continue
+        try:
+            return ctypes.CDLL(name, use_errno=True)
+        except OSError:
+            continue
+    return None
+
+
+_lib = _load_libbpf()
+LIBBPF_AVAILABLE = _lib is not None
+_get_error = None
+
+if LIBBPF_AVAILABLE:
+    _vp = ctypes.c_void_p
+    for _name, _res, _args in (
+        ('bpf_object__open_file',       _vp,            [ctypes.c_char_p, _vp]),
+        ('bpf_object__load',            ctypes.c_int,   [_vp]),
+        ('bpf_object__close',           None,           [_vp]),
+        ('bpf_object__find_map_by_name', _vp,           [_vp, ctypes.c_char_p]),
+        ('bpf_map__fd',                 ctypes.c_int,   [_vp]),
+        ('bpf_map__set_max_entries',    ctypes.c_int,   [_vp, ctypes.c_uint32]),
+        ('bpf_program__attach',         _vp,            [_vp]),
+        ('bpf_link__destroy',           ctypes.c_int,   [_vp]),
+        ('bpf_map_update_elem',         ctypes.c_int,   [ctypes.c_int, _vp, _vp, ctypes.c_uint64]),
+        ('ring_buffer__new',            _vp,            [ctypes.c_int, RING_BUFFER_SAMPLE_FN, _vp, _vp]),
+        ('ring_buffer__poll',           ctypes.c_int,   [_vp, ctypes.c_int]),
+        ('ring_buffer__consume',        ctypes.c_int,   [_vp]),
+        ('ring_buffer__epoll_fd',       ctypes.c_int,   [_vp]),
+        ('ring_buffer__free',           None,           [_vp]),
+    ):
+        _fn = getattr(_lib, _name)
+        _fn.restype, _fn.argtypes = _res, _args
+
+    # Program iteration was renamed in libbpf 0.7, and the old name takes
+    # (prev, obj) rather than (obj, prev)
+    _next_program = getattr(_lib, 'bpf_object__next_program', None)
+    if _next_program is not None:
+        _next_program.restype, _next_program.argtypes = _vp, [_vp, _vp]
+    else:
+        _program_next = _lib.bpf_program__next
+        _program_next.restype, _program_next.argtypes = _vp, [_vp, _vp]
+
+        def _next_program(obj, prev):
+            return _program_next(prev, obj)
+
+    # Pre-1.0 libbpf returns ERR_PTR-encoded pointers instead of NULL + errno
+    _get_error = getattr(_lib, 'libbpf_get_error', None)
+    if _get_error is not None:
+        _get_error.restype, _get_error.argtypes = ctypes.c_long, [_vp]
+
+
+def _check_ptr(ptr, what):
+    err = 0
+    if not ptr:
+        err = ctypes.get_errno() or errno.ENOENT
+    elif _get_error is not None:
+        err = -_get_error(ptr)
+    if err:
+        raise OSError(err, f"{what} failed: {os.strerror(err)}")
+    return ptr
+
+
+def _check_ret(ret, what):
+    if ret < 0:
+        err = -ret if ret != -1 else (ctypes.get_errno() or errno.EINVAL)
+        raise OSError(err, f"{what} failed: {os.strerror(err)}")
+    return ret
+
+
+class BPFObject:
+    """A loaded and attached libbpf object plus its ring buffer"""
+
+    def __init__(self, path):
+        self._obj   = _check_ptr(_lib.bpf_object__open_file(os.fsencode(path), None),
+                                 f"bpf_object__open_file({path})")
+        self._links = []
+        self._rb    = None
+        self._rb_cb = None   # keeps the ctypes callback alive
+
+    def set_max_entries(self, name, n):
+        """Resize a map; only valid between open and load"""
+        m = _check_ptr(_lib.bpf_object__find_map_by_name(self._obj, name.encode()),
+                       f"map '{name}'")
+        _check_ret(_lib.bpf_map__set_max_entries(m, n), f"bpf_map__set_max_entries({name})")
+
+    def load(self):
+        _check_ret(_lib.bpf_object__load(self._obj), "bpf_object__load")
+
+    def attach(self):
+        prog = _next_program(self._obj, None)
+        while prog:
+            self._links.append(_check_ptr(_lib.bpf_program__attach(prog),
+                                          "bpf_program__attach"))
+            prog = _next_program(self._obj, prog)
+
+    def map_fd(self, name):
+        m = _check_ptr(_lib.bpf_object__find_map_by_name(self._obj, name.encode()),
+                       f"map '{name}'")
+        return _check_ret(_lib.bpf_map__fd(m), f"bpf_map__fd({name})")
+
+    def update_elem(self, name, key, value):
+        _check_ret(_lib.bpf_map_update_elem(self.map_fd(name), ctypes.byref(key),
+                                            ctypes.byref(value), 0),
+                   f"bpf_map_update_elem({name})")
+
+    def open_ring_buffer(self, name, fn):
+        def _sample(ctx, data, size):
+            fn(ctx, data, size)
+            return 0
+        self._rb_cb = RING_BUFFER_SAMPLE_FN(_sample)
+        self._rb    = _check_ptr(_lib.ring_buffer__new(self.map_fd(name), self._rb_cb,
+                                                       None, None),
+                                 "ring_buffer__new")
+
+    def ring_buffer_poll(self, timeout=-1):
+        ret = _lib.ring_buffer__poll(self._rb, timeout)
+        # A signal interrupting epoll_wait is not an error
+        if ret < 0 and ret != -errno.EINTR:
+            _check_ret(ret, "ring_buffer__poll")
+        return ret
+
+    def ring_buffer_consume(self):
+        return _lib.ring_buffer__consume(self._rb)
+
+    def ring_buffer_epoll_fd(self):
+        return _lib.ring_buffer__epoll_fd(self._rb)
+
+    def close(self):
+        if self._rb:
+            _lib.ring_buffer__free(self._rb)
+            self._rb = None
+        for link in self._links:
+            _lib.bpf_link__destroy(link)
+        self._links = []
+        if self._obj:
+            _lib.bpf_object__close(self._obj)
+            self._obj = None
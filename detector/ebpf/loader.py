@@ -1,23 +1,39 @@
 """
-eBPF Loader — compiles and loads syscall_monitor.c via BCC,
-reads ring buffer events and dispatches to detection engine.
+eBPF Loader — loads the pre-compiled CO-RE object via libbpf (falling back
+to compiling syscall_monitor.c with BCC), reads ring buffer events and
+dispatches to detection engine.
 """
 
 import os
+import sys
 import ctypes
+import select
+import struct
 import logging
 import threading
 from pathlib import Path
 
 logger = logging.getLogger('detector.ebpf')
 
-# BCC import (requires bpfcc installed)
-try:
-    from bcc import BPF
-    BCC_AVAILABLE = True
-except ImportError:
-    BCC_AVAILABLE = False
-    logger.warning("BCC not available — eBPF monitoring disabled")
+from ebpf.libbpf import LIBBPF_AVAILABLE, BPFObject
+from ebpf.drain import DRAIN_AVAILABLE, RingDrain
+
+# Built by ebpf/Makefile at install time
+BPF_OBJECT = Path(__file__).parent / 'syscall_monitor.bpf.o'
+
+# Adaptive poll timeout (ms): doubles while idle, halves under load
+POLL_MIN_MS = 1
+POLL_MAX_MS = 1000
+POLL_EWMA_ALPHA = 0.2
+
+
+def _import_bcc():
+    """BCC's BPF class, or None; bcc is slow to import, so only on fallback"""
+    try:
+        from bcc import BPF
+    except ImportError:
+        return None
+    return BPF
 
 
 class SyscallEvent(ctypes.Structure):
@@ -39,6 +55,10 @@ class SyscallEvent(ctypes.Structure):
     ]
 
 
+class CommKey(ctypes.Structure):
+    _fields_ = [('comm', ctypes.c_char * 16)]
+
+
 EVENT_TYPE_NAMES = {
     1: 'setuid',
     2: 'execve',
@@ -51,85 +71,299 @@ EVENT_TYPE_NAMES = {
 }
 
 
+# Events reach callbacks in batches of plain tuples in this field order;
+# use the index constants below instead of building a dict per event.
+# parent_comm is left as raw NUL-padded bytes; as_event() decodes it.
+EVENT_FIELDS = (
+    'pid', 'ppid', 'uid', 'euid', 'gid', 'new_uid', 'new_gid', 'open_flags',
+    'timestamp', 'event_type', 'comm', 'parent_comm', 'filename', 'syscall_name',
+)
+(PID, PPID, UID, EUID, GID, NEW_UID, NEW_GID, OPEN_FLAGS,
+ TIMESTAMP, EVENT_TYPE, COMM, PARENT_COMM, FILENAME, SYSCALL_NAME) = range(len(EVENT_FIELDS))
+
+
+# Whole SyscallEvent in one unpack; strings come out NUL-padded
+_EVENT_STRUCT = struct.Struct('=8IQI16s16s256s32s')
+_EVENT_SIZE   = _EVENT_STRUCT.size
+_RECORD_SIZE  = ctypes.sizeof(SyscallEvent)   # array stride, includes padding
+
+
+def _cstr(b):
+    return b.split(b'\0', 1)[0].decode('utf-8', errors='replace')
+
+
+def _decode_event(fields):
+    (pid, ppid, uid, euid, gid, new_uid, new_gid, open_flags, timestamp,
+     event_type, comm, parent_comm, filename, syscall) = fields
+    # Only decode what the rules read: syscall_name follows event_type,
+    # parent_comm is decoded by as_event() once an alert fires
+    return (
+        pid, ppid, uid, euid, gid, new_uid, new_gid, open_flags,
+        timestamp, event_type,
+        sys.intern(_cstr(comm)),
+        parent_comm,
+        _cstr(filename),
+        EVENT_TYPE_NAMES.get(event_type) or sys.intern(_cstr(syscall) or 'unknown'),
+    )
+
+
+def as_event(ev):
+    """Expand a batch tuple into the classic event dict"""
+    event = dict(zip(EVENT_FIELDS, ev))
+    # parent_comm stays raw until someone needs the dict
+    if type(event['parent_comm']) is bytes:
+        event['parent_comm'] = sys.intern(_cstr(event['parent_comm']))
+    return event
+
+
 class EBPFLoader:
+    _bpf_src = None   # syscall_monitor.c, read on the first BCC start
+
+    @classmethod
+    def _load_src(cls):
+        if cls._bpf_src is None:
+            cls._bpf_src = (Path(__file__).parent / 'syscall_monitor.c').read_text()
+        return cls._bpf_src
+
     def __init__(self, config):
         self.config    = config
         self.bpf       = None
+        self.backend   = None
         self.callbacks = []
         self._running  = False
         self._thread   = None
-
-        bpf_src = Path(__file__).parent / 'syscall_monitor.c'
-        with open(bpf_src) as f:
-            self._bpf_src = f.read()
+        self._drain    = None
+        self._batch    = []
+        self._drained  = 0
+        self._whitelist = []
+        self.whitelist_in_kernel = False
+        self.batch_size = config.get('ebpf.batch_size', 64)
+        # Preallocated batch of raw records: ring buffer callbacks and the
+        # native drain copy into it, decoding happens once per full batch
+        self._stage     = (SyscallEvent * self.batch_size)()
+        self._stage_at  = ctypes.addressof(self._stage)
+        self._staged    = 0
+        # Ring buffer size in pages; the kernel requires a power of two
+        pages = config.get('ebpf.ringbuf_pages', 4096)
+        self.ringbuf_pages = 1 << max(pages - 1, 0).bit_length()
+        if self.ringbuf_pages != pages:
+            logger.warning(f"ebpf.ringbuf_pages={pages} rounded up to {self.ringbuf_pages}")
+        # Native drain queue slots; also a power of two (index masking)
+        slots = config.get('ebpf.drain_queue', 65536)
+        self.drain_queue = 1 << max(slots - 1, 0).bit_length()
+        if self.drain_queue != slots:
+            logger.warning(f"ebpf.drain_queue={slots} rounded up to {self.drain_queue}")
+        # Drain thread placement; a preempted drain lets the ring buffer overflow.
+        # None = last allowed CPU, resolved when a drain is actually pinned
+        self.drain_cpu      = config.get('ebpf.drain_cpu')
+        self.drain_priority = config.get('ebpf.drain_priority', 0)
 
     def add_callback(self, fn):
         self.callbacks.append(fn)
 
+    def set_whitelist(self, names):
+        """Drop events from these process names inside the eBPF program"""
+        # comm is at most TASK_COMM_LEN - 1 bytes; the kernel truncates longer names
+        self._whitelist = [n.encode()[:15] for n in names]
+        if self.bpf is not None:
+            self._apply_whitelist()
+
+    def _apply_whitelist(self):
+        try:
+            if self.backend == 'libbpf':
+                # Freshly loaded map is empty; entries are only ever added
+                for name in self._whitelist:
+                    self.bpf.update_elem('whitelist', CommKey(name), ctypes.c_uint8(1))
+                self.whitelist_in_kernel = True
+                logger.info(f"In-kernel whitelist loaded ({len(self._whitelist)} processes)")
+                return
+            table = self.bpf['whitelist']
+            table.clear()
+            for name in self._whitelist:
+                key = table.Key()
+                key.comm = name
+                table[key] = table.Leaf(1)
+            self.whitelist_in_kernel = True
+            logger.info(f"In-kernel whitelist loaded ({len(self._whitelist)} processes)")
+        except Exception as e:
+            self.whitelist_in_kernel = False
+            logger.error(f"Whitelist map update failed: {e}")
+
     def start(self):
-        if not BCC_AVAILABLE:
-            logger.warning("BCC not available — using mock mode")
+        if LIBBPF_AVAILABLE and BPF_OBJECT.exists():
+            if self._start_libbpf():
+                return self._start_polling()
+            logger.warning("Falling back to BCC runtime compilation")
+
+        BPF = _import_bcc()
+        if BPF is None:
+            logger.warning("Neither libbpf object nor BCC available — using mock mode")
             return False
 
         logger.info("Compiling eBPF program...")
         try:
-            self.bpf = BPF(text=self._bpf_src)
+            self.bpf = BPF(text=self._load_src().replace('__RB_PAGES__', str(self.ringbuf_pages)))
+            self.backend = 'bcc'
             logger.info("eBPF compiled successfully")
+            self._apply_whitelist()
 
             # Open ring buffer
             self.bpf['events'].open_ring_buffer(self._handle_event)
+        except Exception as e:
+            logger.error(f"eBPF load failed: {e}")
+            return False
+        return self._start_polling()
 
-            self._running = True
-            self._thread  = threading.Thread(target=self._poll_loop, daemon=True)
-            self._thread.start()
-            logger.info("eBPF ring buffer polling started")
+    def _start_libbpf(self):
+        logger.info(f"Loading pre-compiled eBPF object {BPF_OBJECT.name}...")
+        obj = None
+        try:
+            obj = BPFObject(BPF_OBJECT)
+            obj.set_max_entries('events', self.ringbuf_pages * os.sysconf('SC_PAGE_SIZE'))
+            obj.load()
+            obj.attach()
+            self.bpf = obj
+            self.backend = 'libbpf'
+            self._apply_whitelist()
+            if DRAIN_AVAILABLE:
+                # Native thread owns the ring buffer; Python only takes batches
+                self._drain = RingDrain(obj.map_fd('events'), SyscallEvent,
+                                        capacity=self.drain_queue,
+                                        watermark=self.batch_size)
+                self._pin(self._drain.pin)
+            else:
+                obj.open_ring_buffer('events', self._handle_event)
+            logger.info("eBPF object loaded via libbpf")
             return True
-
         except Exception as e:
-            logger.error(f"eBPF load failed: {e}")
+            logger.error(f"libbpf load failed: {e}")
+            if obj is not None:
+                obj.close()
+            self.bpf = self.backend = None
+            self.whitelist_in_kernel = False
             return False
 
+    def _start_polling(self):
+        self._running = True
+        target = self._drain_loop if self._drain else self._poll_loop
+        self._thread  = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        mode = 'native drain' if self._drain else self.backend
+        logger.info(f"eBPF ring buffer polling started ({mode})")
+        return True
+
     def stop(self):
         self._running = False
+        if self._drain:
+            # Joins the native thread, whose exit wakes _drain_loop
+            self._drain.stop()
         if self._thread:
             self._thread.join(timeout=3)
+        if self._thread and self._thread.is_alive():
+            return
+        if self._drain:
+            if self._drain.dropped:
+                logger.warning(f"Native drain queue overflowed: {self._drain.dropped} events dropped")
+            self._drain.close()
+            self._drain = None
+        if self.backend == 'libbpf':
+            self.bpf.close()
 
-    def _poll_loop(self):
-        while self._running:
+    def _pin(self, pin):
+        cpu = self.drain_cpu
+        if cpu is None:
+            if not hasattr(os, 'sched_getaffinity'):
+                return   # no CPU affinity API off Linux
+            cpu = max(os.sched_getaffinity(0))
+        try:
+            pin(cpu, self.drain_priority)
+            logger.info(f"Ring buffer drain pinned to CPU {cpu}"
+                        + (f" (SCHED_FIFO {self.drain_priority})" if self.drain_priority > 0 else ''))
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Could not pin ring buffer drain to CPU {cpu}: {e}")
+
+    @staticmethod
+    def _pin_current_thread(cpu, priority):
+        # pid 0 means the calling thread on Linux
+        os.sched_setaffinity(0, {cpu})
+        if priority > 0:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+
+    def _drain_loop(self):
+        drain = self._drain
+        while self._running and drain.running:
             try:
-                self.bpf.ring_buffer_poll(timeout=100)
+                drain.wait()
+                self._staged = drain.take(self._stage)
+                while self._staged:
+                    self._flush_staged()
+                    self._staged = drain.take(self._stage)
             except Exception as e:
                 if self._running:
-                    logger.error(f"Poll error: {e}")
+                    logger.error(f"Drain error: {e}")
+        if self._running:
+            logger.error("Native drain thread stopped unexpectedly")
 
-    def _handle_event(self, cpu, data, size):
+    def _poll_loop(self):
+        self._pin(self._pin_current_thread)
+        timeout = 100
+        rate    = 0.0   # EWMA of events drained per wake
+        ep      = None
+        if self.backend == 'libbpf':
+            ep = select.epoll()
+            ep.register(self.bpf.ring_buffer_epoll_fd(), select.EPOLLIN)
         try:
-            raw = ctypes.cast(data, ctypes.POINTER(SyscallEvent)).contents
-            event = {
-                'pid':          raw.pid,
-                'ppid':         raw.ppid,
-                'uid':          raw.uid,
-                'euid':         raw.euid,
-                'gid':          raw.gid,
-                'new_uid':      raw.new_uid,
-                'new_gid':      raw.new_gid,
-                'open_flags':   raw.open_flags,
-                'timestamp':    raw.timestamp,
-                'event_type':   raw.event_type,
-                'comm':         raw.comm.decode('utf-8', errors='replace'),
-                'parent_comm':  raw.parent_comm.decode('utf-8', errors='replace'),
-                'filename':     raw.filename.decode('utf-8', errors='replace'),
-                'syscall_name': raw.syscall_name.decode('utf-8', errors='replace').rstrip('\x00'),
-            }
-            # Normalize syscall_name from event_type if empty
-            if not event['syscall_name']:
-                event['syscall_name'] = EVENT_TYPE_NAMES.get(event['event_type'], 'unknown')
-
-            for cb in self.callbacks:
+            while self._running:
                 try:
-                    cb(event)
+                    self._drained = 0
+                    if ep is not None:
+                        ep.poll(timeout / 1000)
+                        # Empty the ring completely on every wake
+                        while self.bpf.ring_buffer_consume() > 0:
+                            pass
+                    else:
+                        self.bpf.ring_buffer_poll(timeout=timeout)
+                        self.bpf.ring_buffer_consume()
+                    # Hand off whatever this wake drained, even a partial batch
+                    if self._staged:
+                        self._flush_staged()
+
+                    rate += POLL_EWMA_ALPHA * (self._drained - rate)
+                    if rate < 1:
+                        timeout = min(timeout * 2, POLL_MAX_MS)
+                    else:
+                        timeout = max(timeout // 2, POLL_MIN_MS)
                 except Exception as e:
-                    logger.error(f"Callback error: {e}")
+                    if self._running:
+                        logger.error(f"Poll error: {e}")
+        finally:
+            if ep is not None:
+                ep.close()
+
+    def _flush_staged(self):
+        buf, unpack = self._stage, _EVENT_STRUCT.unpack_from
+        self._batch  = [_decode_event(unpack(buf, i * _RECORD_SIZE))
+                        for i in range(self._staged)]
+        self._staged = 0
+        self._flush()
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        self._drained += len(batch)
+        for cb in self.callbacks:
+            try:
+                cb(batch)
+            except Exception as e:
+                logger.error(f"Callback error: {e}")
+
+    def _handle_event(self, cpu, data, size):
+        try:
+            # Raw copy into the next free slot; no per-event objects
+            ctypes.memmove(self._stage_at + self._staged * _RECORD_SIZE, data,
+                           min(size, _EVENT_SIZE))
+            self._staged += 1
+            if self._staged >= self.batch_size:
+                self._flush_staged()
 
         except Exception as e:
             logger.error(f"Event parse error: {e}")
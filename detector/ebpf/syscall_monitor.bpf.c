@@ -0,0 +1,219 @@
+/*
+ * syscall_monitor.bpf.c
+ * eBPF program — monitors privilege escalation syscalls
+ * CO-RE build of syscall_monitor.c: compiled once by the Makefile and
+ * loaded through libbpf, so target hosts need neither clang nor headers
+ */
+
+#include "vmlinux.h"
+#include <bpf/bpf_helpers.h>
+#include <bpf/bpf_core_read.h>
+
+#define TASK_COMM_LEN 16
+#define FNAME_LEN     256
+
+/* Event types */
+#define EVENT_SETUID    1
+#define EVENT_EXECVE    2
+#define EVENT_OPENAT    3
+#define EVENT_CHMOD     4
+#define EVENT_CAPSET    5
+#define EVENT_SETGID    6
+#define EVENT_SETREUID  7
+#define EVENT_SETRESUID 8
+
+struct event_t {
+    u32  pid;
+    u32  ppid;
+    u32  uid;
+    u32  euid;
+    u32  gid;
+    u32  new_uid;
+    u32  new_gid;
+    u32  open_flags;
+    u64  timestamp;
+    u32  event_type;
+    char comm[TASK_COMM_LEN];
+    char parent_comm[TASK_COMM_LEN];
+    char filename[FNAME_LEN];
+    char syscall_name[32];
+};
+
+struct comm_key_t {
+    char comm[TASK_COMM_LEN];
+};
+
+/* Resized from ebpf.ringbuf_pages by the loader before load */
+struct {
+    __uint(type, BPF_MAP_TYPE_RINGBUF);
+    __uint(max_entries, 256 * 4096);
+} events SEC(".maps");
+
+/* Identity changes wake the consumer immediately; high-volume exec/file
+ * events skip the wakeup and are collected by its next poll */
+#define WAKE_NOW   BPF_RB_FORCE_WAKEUP
+#define WAKE_LATER BPF_RB_NO_WAKEUP
+
+/* Process names whose events are dropped in-kernel (filled from userspace) */
+struct {
+    __uint(type, BPF_MAP_TYPE_HASH);
+    __uint(max_entries, 1024);
+    __type(key, struct comm_key_t);
+    __type(value, u8);
+} whitelist SEC(".maps");
+
+/* ── Helper: is the current task whitelisted? ─────────────── */
+static __always_inline int is_whitelisted(void) {
+    struct comm_key_t key = {};
+    bpf_get_current_comm(&key.comm, sizeof(key.comm));
+    return bpf_map_lookup_elem(&whitelist, &key) != NULL;
+}
+
+/* ── Helper: root re-asserting root — no rule can fire on it ─ */
+static __always_inline int is_noop_setuid(u32 new_uid) {
+    return new_uid == 0 && (u32)bpf_get_current_uid_gid() == 0;
+}
+
+/* ── Helper: fill common fields ───────────────────────────── */
+static __always_inline void fill_common(struct event_t *e) {
+    struct task_struct *task = (struct task_struct *)bpf_get_current_task();
+    struct task_struct *parent;
+    u64 uid_gid = bpf_get_current_uid_gid();
+
+    e->pid       = bpf_get_current_pid_tgid() >> 32;
+    e->uid       = uid_gid & 0xFFFFFFFF;
+    e->gid       = uid_gid >> 32;
+    e->timestamp = bpf_ktime_get_ns();
+    bpf_get_current_comm(&e->comm, sizeof(e->comm));
+
+    // Read real EUID from task credentials
+    e->euid = BPF_CORE_READ(task, cred, euid.val);
+
+    parent = BPF_CORE_READ(task, real_parent);
+    if (parent) {
+        BPF_CORE_READ_STR_INTO(&e->parent_comm, parent, comm);
+        e->ppid = BPF_CORE_READ(parent, tgid);
+    }
+}
+
+/* ── setuid ───────────────────────────────────────────────── */
+SEC("tracepoint/syscalls/sys_enter_setuid")
+int handle_setuid(struct trace_event_raw_sys_enter *ctx) {
+    if (is_noop_setuid((u32)ctx->args[0]) || is_whitelisted()) return 0;
+    struct event_t *e = bpf_ringbuf_reserve(&events, sizeof(*e), 0);
+    if (!e) return 0;
+    __builtin_memset(e, 0, sizeof(*e));
+    fill_common(e);
+    e->event_type = EVENT_SETUID;
+    e->new_uid    = (u32)ctx->args[0];
+    __builtin_memcpy(e->syscall_name, "setuid", 7);
+    bpf_ringbuf_submit(e, WAKE_NOW);
+    return 0;
+}
+
+/* ── setreuid ─────────────────────────────────────────────── */
+SEC("tracepoint/syscalls/sys_enter_setreuid")
+int handle_setreuid(struct trace_event_raw_sys_enter *ctx) {
+    if (is_noop_setuid((u32)ctx->args[1]) || is_whitelisted()) return 0;
+    struct event_t *e = bpf_ringbuf_reserve(&events, sizeof(*e), 0);
+    if (!e) return 0;
+    __builtin_memset(e, 0, sizeof(*e));
+    fill_common(e);
+    e->event_type = EVENT_SETREUID;
+    e->new_uid    = (u32)ctx->args[1];   /* euid */
+    __builtin_memcpy(e->syscall_name, "setreuid", 9);
+    bpf_ringbuf_submit(e, WAKE_NOW);
+    return 0;
+}
+
+/* ── setresuid ────────────────────────────────────────────── */
+SEC("tracepoint/syscalls/sys_enter_setresuid")
+int handle_setresuid(struct trace_event_raw_sys_enter *ctx) {
+    if (is_noop_setuid((u32)ctx->args[1]) || is_whitelisted()) return 0;
+    struct event_t *e = bpf_ringbuf_reserve(&events, sizeof(*e), 0);
+    if (!e) return 0;
+    __builtin_memset(e, 0, sizeof(*e));
+    fill_common(e);
+    e->event_type = EVENT_SETRESUID;
+    e->new_uid    = (u32)ctx->args[1];   /* euid */
+    __builtin_memcpy(e->syscall_name, "setresuid", 10);
+    bpf_ringbuf_submit(e, WAKE_NOW);
+    return 0;
+}
+
+/* ── setgid ───────────────────────────────────────────────── */
+SEC("tracepoint/syscalls/sys_enter_setgid")
+int handle_setgid(struct trace_event_raw_sys_enter *ctx) {
+    if (is_whitelisted()) return 0;
+    struct event_t *e = bpf_ringbuf_reserve(&events, sizeof(*e), 0);
+    if (!e) return 0;
+    __builtin_memset(e, 0, sizeof(*e));
+    fill_common(e);
+    e->event_type = EVENT_SETGID;
+    e->new_gid    = (u32)ctx->args[0];
+    __builtin_memcpy(e->syscall_name, "setgid", 7);
+    bpf_ringbuf_submit(e, WAKE_NOW);
+    return 0;
+}
+
+/* ── execve ───────────────────────────────────────────────── */
+SEC("tracepoint/syscalls/sys_enter_execve")
+int handle_execve(struct trace_event_raw_sys_enter *ctx) {
+    if (is_whitelisted()) return 0;
+    struct event_t *e = bpf_ringbuf_reserve(&events, sizeof(*e), 0);
+    if (!e) return 0;
+    __builtin_memset(e, 0, sizeof(*e));
+    fill_common(e);
+    e->event_type = EVENT_EXECVE;
+    bpf_probe_read_user_str(&e->filename, sizeof(e->filename), (const char *)ctx->args[0]);
+    __builtin_memcpy(e->syscall_name, "execve", 7);
+    bpf_ringbuf_submit(e, WAKE_LATER);
+    return 0;
+}
+
+/* ── openat ───────────────────────────────────────────────── */
+SEC("tracepoint/syscalls/sys_enter_openat")
+int handle_openat(struct trace_event_raw_sys_enter *ctx) {
+    if (is_whitelisted()) return 0;
+    struct event_t *e = bpf_ringbuf_reserve(&events, sizeof(*e), 0);
+    if (!e) return 0;
+    __builtin_memset(e, 0, sizeof(*e));
+    fill_common(e);
+    e->event_type = EVENT_OPENAT;
+    e->open_flags = (u32)ctx->args[2];
+    bpf_probe_read_user_str(&e->filename, sizeof(e->filename), (const char *)ctx->args[1]);
+    __builtin_memcpy(e->syscall_name, "openat", 7);
+    bpf_ringbuf_submit(e, WAKE_LATER);
+    return 0;
+}
+
+/* ── chmod ────────────────────────────────────────────────── */
+SEC("tracepoint/syscalls/sys_enter_chmod")
+int handle_chmod(struct trace_event_raw_sys_enter *ctx) {
+    if (is_whitelisted()) return 0;
+    struct event_t *e = bpf_ringbuf_reserve(&events, sizeof(*e), 0);
+    if (!e) return 0;
+    __builtin_memset(e, 0, sizeof(*e));
+    fill_common(e);
+    e->event_type = EVENT_CHMOD;
+    bpf_probe_read_user_str(&e->filename, sizeof(e->filename), (const char *)ctx->args[0]);
+    __builtin_memcpy(e->syscall_name, "chmod", 6);
+    bpf_ringbuf_submit(e, WAKE_LATER);
+    return 0;
+}
+
+/* ── capset ───────────────────────────────────────────────── */
+SEC("tracepoint/syscalls/sys_enter_capset")
+int handle_capset(struct trace_event_raw_sys_enter *ctx) {
+    if (is_whitelisted()) return 0;
+    struct event_t *e = bpf_ringbuf_reserve(&events, sizeof(*e), 0);
+    if (!e) return 0;
+    __builtin_memset(e, 0, sizeof(*e));
+    fill_common(e);
+    e->event_type = EVENT_CAPSET;
+    __builtin_memcpy(e->syscall_name, "capset", 7);
+    bpf_ringbuf_submit(e, WAKE_NOW);
+    return 0;
+}
+
+char LICENSE[] SEC("license") = "GPL";
@@ -38,7 +38,32 @@ struct event_t {
     char syscall_name[32];
 };
 
-BPF_RINGBUF_OUTPUT(events, 256);
+struct comm_key_t {
+    char comm[TASK_COMM_LEN];
+};
+
+/* Size in pages (power of 2), substituted by the loader */
+BPF_RINGBUF_OUTPUT(events, __RB_PAGES__);
+
+/* Identity changes wake the consumer immediately; high-volume exec/file
+ * events skip the wakeup and are collected by its next poll */
+#define WAKE_NOW   BPF_RB_FORCE_WAKEUP
+#define WAKE_LATER BPF_RB_NO_WAKEUP
+
+/* Process names whose events are dropped in-kernel (filled from userspace) */
+BPF_HASH(whitelist, struct comm_key_t, u8, 1024);
+
+/* ── Helper: is the current task whitelisted? ─────────────── */
+static inline int is_whitelisted(void) {
+    struct comm_key_t key = {};
+    bpf_get_current_comm(&key.comm, sizeof(key.comm));
+    return whitelist.lookup(&key) != NULL;
+}
+
+/* ── Helper: root re-asserting root — no rule can fire on it ─ */
+static inline int is_noop_setuid(u32 new_uid) {
+    return new_uid == 0 && (u32)bpf_get_current_uid_gid() == 0;
+}
 
 /* ── Helper: fill common fields ───────────────────────────── */
 static inline void fill_common(struct event_t *e) {
@@ -72,6 +97,7 @@ static inline void fill_common(struct event_t *e) {
 
 /* ── setuid ───────────────────────────────────────────────── */
 TRACEPOINT_PROBE(syscalls, sys_enter_setuid) {
+    if (is_noop_setuid((u32)args->uid) || is_whitelisted()) return 0;
     struct event_t *e = events.ringbuf_reserve(sizeof(*e));
     if (!e) return 0;
     __builtin_memset(e, 0, sizeof(*e));
@@ -79,12 +105,13 @@ TRACEPOINT_PROBE(syscalls, sys_enter_setuid) {
     e->event_type = EVENT_SETUID;
     e->new_uid    = (u32)args->uid;
     __builtin_memcpy(e->syscall_name, "setuid", 7);
-    events.ringbuf_submit(e, 0);
+    events.ringbuf_submit(e, WAKE_NOW);
     return 0;
 }
 
 /* ── setreuid ─────────────────────────────────────────────── */
 TRACEPOINT_PROBE(syscalls, sys_enter_setreuid) {
+    if (is_noop_setuid((u32)args->euid) || is_whitelisted()) return 0;
     struct event_t *e = events.ringbuf_reserve(sizeof(*e));
     if (!e) return 0;
     __builtin_memset(e, 0, sizeof(*e));
@@ -92,12 +119,13 @@ TRACEPOINT_PROBE(syscalls, sys_enter_setreuid) {
     e->event_type = EVENT_SETREUID;
     e->new_uid    = (u32)args->euid;
     __builtin_memcpy(e->syscall_name, "setreuid", 9);
-    events.ringbuf_submit(e, 0);
+    events.ringbuf_submit(e, WAKE_NOW);
     return 0;
 }
 
 /* ── setresuid ────────────────────────────────────────────── */
 TRACEPOINT_PROBE(syscalls, sys_enter_setresuid) {
+    if (is_noop_setuid((u32)args->euid) || is_whitelisted()) return 0;
     struct event_t *e = events.ringbuf_reserve(sizeof(*e));
     if (!e) return 0;
     __builtin_memset(e, 0, sizeof(*e));
@@ -105,12 +133,13 @@ TRACEPOINT_PROBE(syscalls, sys_enter_setresuid) {
     e->event_type = EVENT_SETRESUID;
     e->new_uid    = (u32)args->euid;
     __builtin_memcpy(e->syscall_name, "setresuid", 10);
-    events.ringbuf_submit(e, 0);
+    events.ringbuf_submit(e, WAKE_NOW);
     return 0;
 }
 
 /* ── setgid ───────────────────────────────────────────────── */
 TRACEPOINT_PROBE(syscalls, sys_enter_setgid) {
+    if (is_whitelisted()) return 0;
     struct event_t *e = events.ringbuf_reserve(sizeof(*e));
     if (!e) return 0;
     __builtin_memset(e, 0, sizeof(*e));
@@ -118,12 +147,13 @@ TRACEPOINT_PROBE(syscalls, sys_enter_setgid) {
     e->event_type = EVENT_SETGID;
     e->new_gid    = (u32)args->gid;
     __builtin_memcpy(e->syscall_name, "setgid", 7);
-    events.ringbuf_submit(e, 0);
+    events.ringbuf_submit(e, WAKE_NOW);
     return 0;
 }
 
 /* ── execve ───────────────────────────────────────────────── */
 TRACEPOINT_PROBE(syscalls, sys_enter_execve) {
+    if (is_whitelisted()) return 0;
     struct event_t *e = events.ringbuf_reserve(sizeof(*e));
     if (!e) return 0;
     __builtin_memset(e, 0, sizeof(*e));
@@ -131,12 +161,13 @@ TRACEPOINT_PROBE(syscalls, sys_enter_execve) {
     e->event_type = EVENT_EXECVE;
     bpf_probe_read_user_str(&e->filename, sizeof(e->filename), args->filename);
     __builtin_memcpy(e->syscall_name, "execve", 7);
-    events.ringbuf_submit(e, 0);
+    events.ringbuf_submit(e, WAKE_LATER);
     return 0;
 }
 
 /* ── openat ───────────────────────────────────────────────── */
 TRACEPOINT_PROBE(syscalls, sys_enter_openat) {
+    if (is_whitelisted()) return 0;
     struct event_t *e = events.ringbuf_reserve(sizeof(*e));
     if (!e) return 0;
     __builtin_memset(e, 0, sizeof(*e));
@@ -145,12 +176,13 @@ TRACEPOINT_PROBE(syscalls, sys_enter_openat) {
     e->open_flags = (u32)args->flags;
     bpf_probe_read_user_str(&e->filename, sizeof(e->filename), args->filename);
     __builtin_memcpy(e->syscall_name, "openat", 7);
-    events.ringbuf_submit(e, 0);
+    events.ringbuf_submit(e, WAKE_LATER);
     return 0;
 }
 
 /* ── chmod ────────────────────────────────────────────────── */
 TRACEPOINT_PROBE(syscalls, sys_enter_chmod) {
+    if (is_whitelisted()) return 0;
     struct event_t *e = events.ringbuf_reserve(sizeof(*e));
     if (!e) return 0;
     __builtin_memset(e, 0, sizeof(*e));
@@ -158,18 +190,19 @@ TRACEPOINT_PROBE(syscalls, sys_enter_chmod) {
     e->event_type = EVENT_CHMOD;
     bpf_probe_read_user_str(&e->filename, sizeof(e->filename), args->filename);
     __builtin_memcpy(e->syscall_name, "chmod", 6);
-    events.ringbuf_submit(e, 0);
+    events.ringbuf_submit(e, WAKE_LATER);
     return 0;
 }
 
 /* ── capset ───────────────────────────────────────────────── */
 TRACEPOINT_PROBE(syscalls, sys_enter_capset) {
+    if (is_whitelisted()) return 0;
     struct event_t *e = events.ringbuf_reserve(sizeof(*e));
     if (!e) return 0;
     __builtin_memset(e, 0, sizeof(*e));
     fill_common(e);
     e->event_type = EVENT_CAPSET;
     __builtin_memcpy(e->syscall_name, "capset", 7);
-    events.ringbuf_submit(e, 0);
+    events.ringbuf_submit(e, WAKE_NOW);
     return 0;
 }
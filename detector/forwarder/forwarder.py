@@ -14,23 +14,37 @@ import sys
 import os
 import json
 import time
+import select
+import socket
 import sqlite3
 import logging
 import argparse
+import base64
+import http.client
 import urllib.request
 import urllib.error
+from urllib.parse import urlsplit
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode()
+
 # ── Paths ─────────────────────────────────────────────────────────────────────
 BASE_DIR    = Path(__file__).parent.parent
 CONFIG_FILE = Path(__file__).parent / 'forwarder.config.json'
 DB_PATH     = BASE_DIR / 'data' / 'database' / 'detector.db'
 LOG_FILE    = BASE_DIR / 'logs' / 'forwarder.log'
+DETECTOR_CONFIG = BASE_DIR / 'config.yaml'
+NOTIFY_SOCKET_DEFAULT = '/run/privesc/alerts.sock'
 
 # ── Settings ──────────────────────────────────────────────────────────────────
-POLL_INTERVAL  = 30
-BATCH_SIZE     = 50
+POLL_INTERVAL  = 30     # max idle wait; new alerts wake the forwarder sooner
+BATCH_SIZE     = 500
 RETRY_ATTEMPTS = 3
 RETRY_DELAY    = 5
 
@@ -81,7 +95,7 @@ def setup():
     try:
         req = urllib.request.Request(
             f'{vercel_url}/api/alerts/ingest',
-            data=json.dumps([]).encode(),
+            data=_dumps([]),
             headers={'Content-Type': 'application/json', 'X-API-Key': api_key},
             method='POST'
         )
@@ -127,64 +141,150 @@ def show_status():
 
 # ── Forwarder core ────────────────────────────────────────────────────────────
 
+# Payload schema, in the column order of _SQL_FETCH; rowid comes last so
+# zip() drops it without slicing each row
+ALERT_FIELDS = (
+    'alert_id', 'rule_id', 'rule_name', 'severity', 'confidence', 'description',
+    'pid', 'ppid', 'uid', 'new_uid', 'comm', 'parent_comm', 'syscall',
+    'filename', 'timestamp',
+)
+
+_SQL_FETCH = f"""
+    SELECT {', '.join(ALERT_FIELDS)}, rowid
+    FROM alerts
+    WHERE rowid > ?
+    ORDER BY rowid ASC LIMIT ?
+"""
+
+# One connection and cursor for the life of the daemon
+_conn = None
+_cur  = None
+
+
+def _db():
+    global _conn, _cur
+    if _conn is None:
+        _conn = sqlite3.connect(str(DB_PATH), timeout=5, isolation_level=None,
+                                check_same_thread=False)
+        _conn.executescript('PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;')
+        _cur = _conn.cursor()
+    return _cur
+
+
+def _close_db():
+    global _conn, _cur
+    if _conn is not None:
+        _conn.close()
+    _conn = _cur = None
+
+
 def fetch_new_alerts(last_id, limit=BATCH_SIZE):
+    """New alert rows as (*ALERT_FIELDS, rowid) tuples"""
     if not DB_PATH.exists():
         log.warning(f'Database not found: {DB_PATH}')
         return []
     try:
-        conn = sqlite3.connect(str(DB_PATH), timeout=5)
-        conn.row_factory = sqlite3.Row
-        rows = conn.execute('''
-            SELECT rowid, alert_id, rule_id, rule_name, severity, confidence,
-                   description, pid, ppid, uid, new_uid, comm, parent_comm,
-                   syscall, filename, timestamp, created_at
-            FROM alerts
-            WHERE rowid > ?
-            ORDER BY rowid ASC LIMIT ?
-        ''', (last_id, limit)).fetchall()
-        conn.close()
-        return [dict(r) for r in rows]
+        return _db().execute(_SQL_FETCH, (last_id, limit)).fetchall()
     except sqlite3.Error as e:
         log.error(f'SQLite: {e}')
+        _close_db()
         return []
 
 
+# Kept open between polls so each batch skips the TCP + TLS handshake
+_http     = None
+_http_key = None
+
+
+def _proxy_for(parts):
+    """Proxy URL from HTTP(S)_PROXY / NO_PROXY, as urllib would pick it"""
+    proxy = urllib.request.getproxies().get(parts.scheme)
+    if not proxy or urllib.request.proxy_bypass(parts.hostname):
+        return None
+    proxy = urlsplit(proxy if '://' in proxy else f'http://{proxy}')
+    if proxy.scheme != 'http':
+        # http.client only speaks to a proxy in plain HTTP (socks/https are not)
+        log.warning(f'Unsupported {proxy.scheme}:// proxy for {parts.scheme} — connecting directly')
+        return None
+    return proxy
+
+
+def _proxy_auth(proxy):
+    if not proxy.username:
+        return {}
+    cred = f'{proxy.username}:{proxy.password or ""}'.encode()
+    return {'Proxy-Authorization': 'Basic ' + base64.b64encode(cred).decode()}
+
+
+def _http_conn(parts, proxy):
+    global _http, _http_key
+    key = (parts.scheme, parts.netloc, proxy)
+    if _http is None or _http_key != key:
+        if _http is not None:
+            _http.close()
+        https = parts.scheme == 'https'
+        cls   = http.client.HTTPSConnection if https else http.client.HTTPConnection
+        if proxy is None:
+            _http = cls(parts.netloc, timeout=15)
+        elif https:
+            # CONNECT through the proxy; TLS stays end to end with the server
+            _http = cls(proxy.hostname, proxy.port or 80, timeout=15)
+            _http.set_tunnel(parts.hostname, parts.port or 443, headers=_proxy_auth(proxy))
+        else:
+            _http = http.client.HTTPConnection(proxy.hostname, proxy.port or 80, timeout=15)
+        _http_key = key
+    return _http
+
+
+def _post(url, data, headers):
+    """POST over the pooled connection; returns (status, body, headers)"""
+    parts  = urlsplit(url)
+    proxy  = _proxy_for(parts)
+    conn   = _http_conn(parts, proxy)
+    target = parts.path or '/'
+    if proxy is not None and parts.scheme != 'https':
+        # A plain-HTTP proxy takes the absolute URL and its own auth header
+        target, headers = url, {**headers, **_proxy_auth(proxy)}
+    for retry in (True, False):
+        try:
+            conn.request('POST', target, body=data, headers=headers)
+            r = conn.getresponse()
+            return r.status, r.read(), r.headers
+        except (http.client.BadStatusLine, ConnectionError):
+            # Server dropped the idle keep-alive socket; reconnect once
+            conn.close()
+            if not retry:
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+
 def post_alerts(cfg, alerts):
-    payload = [{
-        'alert_id':    a.get('alert_id'),
-        'rule_id':     a.get('rule_id', ''),
-        'rule_name':   a.get('rule_name', ''),
-        'severity':    a.get('severity', 'LOW'),
-        'confidence':  a.get('confidence'),
-        'description': a.get('description', ''),
-        'pid':         a.get('pid'),
-        'ppid':        a.get('ppid'),
-        'uid':         a.get('uid'),
-        'new_uid':     a.get('new_uid'),
-        'comm':        a.get('comm', ''),
-        'parent_comm': a.get('parent_comm', ''),
-        'syscall':     a.get('syscall', ''),
-        'filename':    a.get('filename', ''),
-        'timestamp':   a.get('timestamp'),
-    } for a in alerts]
+    payload = [dict(zip(ALERT_FIELDS, a)) for a in alerts]
 
     url  = f"{cfg['vercel_url']}/api/alerts/ingest"
-    data = json.dumps(payload).encode()
+    data = _dumps(payload)
+    headers = {
+        'Content-Type': 'application/json',
+        'X-API-Key':    cfg['api_key'],
+        'Connection':   'keep-alive',
+    }
 
     for attempt in range(1, RETRY_ATTEMPTS + 1):
         try:
-            req = urllib.request.Request(
-                url, data=data,
-                headers={'Content-Type': 'application/json', 'X-API-Key': cfg['api_key']},
-                method='POST'
-            )
-            with urllib.request.urlopen(req, timeout=15) as r:
-                return json.loads(r.read()).get('inserted', 0)
-
-        except urllib.error.HTTPError as e:
-            body = e.read().decode()
-            log.error(f'HTTP {e.code} attempt {attempt}: {body}')
-            if e.code in (401, 403):
+            status, body, resp_headers = _post(url, data, headers)
+            if status < 300:
+                return json.loads(body).get('inserted', 0)
+            if status < 400:
+                # Redirects are not followed: a POST must not be silently
+                # replayed elsewhere, and retrying the same URL cannot help
+                log.error(f'HTTP {status} redirect to {resp_headers.get("Location")} '
+                          f'— update vercel_url with --setup')
+                return 0
+
+            log.error(f'HTTP {status} attempt {attempt}: {body.decode(errors="replace")}')
+            if status in (401, 403):
                 log.critical('Invalid API key — run --setup again')
                 return 0
         except Exception as e:
@@ -196,6 +296,77 @@ def post_alerts(cfg, alerts):
     return 0
 
 
+# ── Wakeups ───────────────────────────────────────────────────────────────────
+
+def notify_socket_path():
+    """alerts.notify_socket from the detector's config.yaml, so both sides agree"""
+    try:
+        import yaml
+        with open(DETECTOR_CONFIG) as f:
+            alerts = (yaml.safe_load(f) or {}).get('alerts') or {}
+    except Exception as e:
+        log.warning(f'Could not read {DETECTOR_CONFIG} ({e}) — using {NOTIFY_SOCKET_DEFAULT}')
+        return Path(NOTIFY_SOCKET_DEFAULT)
+    path = alerts.get('notify_socket', NOTIFY_SOCKET_DEFAULT)
+    return Path(path) if path else None
+
+
+def open_notify_socket():
+    """Bind the datagram socket the detector pings after writing alerts"""
+    path = notify_socket_path()
+    if path is None:
+        log.info('Notify socket disabled in config — watching data_version instead')
+        return None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(path))
+        sock.setblocking(False)
+        return sock
+    except OSError as e:
+        log.warning(f'Notify socket unavailable ({e}) — watching data_version instead')
+        return None
+
+
+def _data_version():
+    try:
+        return _db().execute('PRAGMA data_version').fetchone()[0]
+    except sqlite3.Error:
+        _close_db()
+        return None
+
+
+def wait_for_alerts(sock, max_idle=POLL_INTERVAL):
+    """Block until the detector reports new alerts or max_idle passes"""
+    if sock is not None:
+        ready, _, _ = select.select([sock], [], [], max_idle)
+        if ready:
+            # Collapse every queued ping into one wakeup
+            try:
+                while sock.recv(16):
+                    pass
+            except BlockingIOError:
+                pass
+        return
+
+    # No socket: watch PRAGMA data_version with exponential backoff
+    if not DB_PATH.exists():
+        time.sleep(max_idle)
+        return
+    deadline = time.monotonic() + max_idle
+    last     = _data_version()
+    delay    = 0.25
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(delay, remaining))
+        if _data_version() != last:
+            return
+        delay = min(delay * 2, max_idle)
+
+
 def run():
     cfg = load_config()
     if not cfg:
@@ -203,18 +374,20 @@ def run():
         sys.exit(1)
 
     log.info(f"Starting — machine: {cfg['machine_name']} → {cfg['vercel_url']}")
-    log.info(f"Poll: {POLL_INTERVAL}s | Batch: {BATCH_SIZE}")
+    log.info(f"Max idle: {POLL_INTERVAL}s | Batch: {BATCH_SIZE}")
 
     last_id = cfg.get('last_synced_id', 0)
+    sock    = open_notify_socket()
 
     while True:
+        alerts = None
         try:
             alerts = fetch_new_alerts(last_id)
             if alerts:
                 log.info(f'Forwarding {len(alerts)} alerts (rowid > {last_id})')
                 inserted = post_alerts(cfg, alerts)
                 if inserted >= 0:
-                    last_id = alerts[-1].get('rowid', alerts[-1].get('id', last_id))
+                    last_id = alerts[-1][-1]
                     cfg['last_synced_id'] = last_id
                     cfg['last_sync_time'] = datetime.now().isoformat()
                     save_config(cfg)
@@ -228,7 +401,14 @@ def run():
         except Exception as e:
             log.error(f'Poll error: {e}')
 
-        time.sleep(POLL_INTERVAL)
+        # A full batch means more rows are waiting — fetch again right away
+        if alerts and len(alerts) >= BATCH_SIZE:
+            continue
+        try:
+            wait_for_alerts(sock)
+        except KeyboardInterrupt:
+            log.info('Forwarder stopped')
+            break
 
 
 if __name__ == '__main__':
@@ -7,7 +7,6 @@ import sys
 import os
 import signal
 import logging
-import time
 import argparse
 import threading
 
@@ -54,13 +53,12 @@ def main():
     logger.info("Starting detection engine...")
     engine = DetectionEngine(config)
 
-    # Graceful shutdown handler
+    # Graceful shutdown handler — wakes the main thread, which cleans up
+    stop_event = threading.Event()
+
     def shutdown(signum, frame):
         logger.info("Shutdown signal received...")
-        engine.stop()
-        db.close()
-        logger.info("Detector stopped.")
-        sys.exit(0)
+        stop_event.set()
 
     signal.signal(signal.SIGINT,  shutdown)
     signal.signal(signal.SIGTERM, shutdown)
@@ -69,13 +67,16 @@ def main():
     try:
         engine.start()
         logger.info("Detector running. Press Ctrl+C to stop.")
-        while True:
-            time.sleep(1)
+        stop_event.wait()
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
         engine.stop()
         sys.exit(1)
 
+    engine.stop()
+    db.close()
+    logger.info("Detector stopped.")
+
 
 if __name__ == '__main__':
     main()
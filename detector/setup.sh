@@ -20,11 +20,18 @@ SERVICE_USER="root"
 echo -e "${YELLOW}[1/6] Installing system dependencies...${NC}"
 apt-get update -qq
 apt-get install -y \
-    python3 python3-pip \
+    python3 python3-pip python3-numpy \
     bpfcc-tools python3-bpfcc \
     linux-headers-$(uname -r) \
     sqlite3 \
     2>/dev/null || true
+# Optional CO-RE build dependencies, one at a time: names differ across
+# releases (no libbpf1/bpftool on Ubuntu 22.04) and a missing one must not
+# block the rest or the BCC fallback above
+for pkg in clang libbpf-dev libbpf1 bpftool; do
+    apt-get install -y "$pkg" 2>/dev/null || \
+        echo -e "  ${YELLOW}! $pkg unavailable — skipped${NC}"
+done
 echo -e "  ${GREEN}✓ System dependencies installed${NC}"
 
 echo -e "${YELLOW}[2/6] Creating install directory...${NC}"
@@ -32,6 +39,15 @@ mkdir -p "$INSTALL_DIR"
 cp -r . "$INSTALL_DIR/"
 echo -e "  ${GREEN}✓ Files copied to $INSTALL_DIR${NC}"
 
+# Pre-compile the CO-RE eBPF object and native drain; without the object
+# the loader falls back to BCC, without libdrain.so to a Python poll loop
+make -s -k -C "$INSTALL_DIR/ebpf" 2>/dev/null || true
+if [ -f "$INSTALL_DIR/ebpf/syscall_monitor.bpf.o" ]; then
+    echo -e "  ${GREEN}✓ eBPF object built (libbpf)${NC}"
+else
+    echo -e "  ${YELLOW}! eBPF object build failed — BCC runtime compilation will be used${NC}"
+fi
+
 echo -e "${YELLOW}[3/6] Installing Python dependencies...${NC}"
 pip3 install --break-system-packages -r "$INSTALL_DIR/requirements.txt" || \
 pip3 install -r "$INSTALL_DIR/requirements.txt"
@@ -40,9 +56,7 @@ echo -e "  ${GREEN}✓ Python dependencies installed${NC}"
 echo -e "${YELLOW}[4/6] Creating directories and initializing database...${NC}"
 mkdir -p "$INSTALL_DIR/logs"
 mkdir -p "$INSTALL_DIR/data/database"
-mkdir -p "$INSTALL_DIR/data/baselines"
 touch "$INSTALL_DIR/logs/.gitkeep"
-touch "$INSTALL_DIR/data/baselines/.gitkeep"
 
 # Initialize SQLite database with schema
 python3 -c "
@@ -53,7 +53,7 @@ find / -name "detector.db" 2>/dev/null | while read f; do
     rm -f "$f"
     echo -e "  ${GREEN}✓ Removed: $f${NC}"
 done
-find / -name "baseline_*.json" 2>/dev/null | while read f; do
+find / -name "baseline_*.json*" 2>/dev/null | while read f; do
     rm -f "$f"
     echo -e "  ${GREEN}✓ Removed: $f${NC}"
 done
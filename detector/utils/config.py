@@ -1,34 +1,45 @@
 """Configuration loader"""
 import os
-import yaml
 from pathlib import Path
 
+_MISSING = object()
+
 
 class Config:
     def __init__(self, config_path='config.yaml'):
         self._path = Path(config_path)
         self._data = {}
+        self._cache = {}   # dot-path -> resolved value (or _MISSING)
         self._load()
 
     def _load(self):
         if not self._path.exists():
             raise FileNotFoundError(f"Config not found: {self._path}")
+        import yaml   # deferred: only needed once a config file is read
         with open(self._path) as f:
             self._data = yaml.safe_load(f) or {}
+        self._cache.clear()
 
     def get(self, key, default=None):
         """Get config value using dot notation: 'app.debug'"""
-        keys = key.split('.')
-        val  = self._data
-        for k in keys:
+        try:
+            val = self._cache[key]
+        except KeyError:
+            val = self._cache[key] = self._resolve(key)
+        return default if val is _MISSING else val
+
+    def _resolve(self, key):
+        val = self._data
+        for k in key.split('.'):
             if not isinstance(val, dict):
-                return default
+                return _MISSING
             val = val.get(k)
             if val is None:
-                return default
+                return _MISSING
         return val
 
     def set(self, key, value):
+        self._cache.clear()
         keys = key.split('.')
         d = self._data
         for k in keys[:-1]:
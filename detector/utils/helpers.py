@@ -1,35 +1,71 @@
 """Utility helpers"""
 import os
-import pwd
 import time
+from functools import lru_cache
+
+_WRITABLE = ('/tmp/', '/dev/shm/', '/var/tmp/', '/run/user/', '/home/')
+
+
+# /proc answers are cached per 200 ms bucket — PIDs get reused, so
+# entries must expire; the bucket is part of the cache key
+_PROC_BUCKETS_PER_SEC = 5
+
+
+def _proc_bucket():
+    return int(time.monotonic() * _PROC_BUCKETS_PER_SEC)
+
+
+@lru_cache(maxsize=4096)
+def _process_name(pid, bucket):
+    fd = os.open(f'/proc/{pid}/comm', os.O_RDONLY)
+    try:
+        return os.read(fd, 64).decode('utf-8', errors='replace').strip()
+    finally:
+        os.close(fd)
+
+
+@lru_cache(maxsize=1024)
+def _process_cmdline(pid, bucket):
+    # Raw fd, no file object; cmdline can exceed one read, so loop to EOF
+    fd = os.open(f'/proc/{pid}/cmdline', os.O_RDONLY)
+    try:
+        chunks = []
+        while chunk := os.read(fd, 4096):
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    return b''.join(chunks).decode('utf-8', errors='replace').replace('\x00', ' ').strip()
+
+
+@lru_cache(maxsize=4096)
+def _username(uid):
+    import pwd   # Linux-only, and only needed once an alert is enriched
+    return pwd.getpwuid(uid).pw_name
 
 
 def get_process_name(pid):
     try:
-        with open(f'/proc/{pid}/comm') as f:
-            return f.read().strip()
+        return _process_name(pid, _proc_bucket())
     except:
         return 'unknown'
 
 
 def get_process_cmdline(pid):
     try:
-        with open(f'/proc/{pid}/cmdline', 'rb') as f:
-            return f.read().decode('utf-8', errors='replace').replace('\x00', ' ').strip()
+        return _process_cmdline(pid, _proc_bucket())
     except:
         return ''
 
 
 def get_username(uid):
     try:
-        return pwd.getpwuid(uid).pw_name
+        return _username(uid)
     except:
         return str(uid)
 
 
 def is_writable_path(path):
-    writable = ['/tmp/', '/dev/shm/', '/var/tmp/', '/run/user/', '/home/']
-    return any(str(path).startswith(w) for w in writable)
+    return str(path).startswith(_WRITABLE)
 
 
 def format_uptime(seconds):
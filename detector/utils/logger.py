@@ -2,6 +2,19 @@
 import logging
 import logging.handlers
 import os
+import queue
+import atexit
+
+# Handlers run on this listener's thread; callers only enqueue records
+_listener = None
+
+
+@atexit.register
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 class ColorFormatter(logging.Formatter):
@@ -29,6 +42,7 @@ def setup_logging(config):
     root = logging.getLogger()
     root.setLevel(level)
     root.handlers.clear()
+    handlers = []
 
     # Console
     if config.get('logging.console_enabled', True):
@@ -38,7 +52,7 @@ def setup_logging(config):
             ch.setFormatter(ColorFormatter(fmt, datefmt=datefmt))
         else:
             ch.setFormatter(logging.Formatter(fmt, datefmt=datefmt))
-        root.addHandler(ch)
+        handlers.append(ch)
 
     # File
     if config.get('logging.file_enabled', True):
@@ -51,4 +65,11 @@ def setup_logging(config):
         )
         fh.setLevel(level)
         fh.setFormatter(logging.Formatter(fmt, datefmt=datefmt))
-        root.addHandler(fh)
+        handlers.append(fh)
+
+    global _listener
+    _stop_listener()
+    q = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(logging.handlers.QueueHandler(q))